@@ -0,0 +1,244 @@
+# Versioned model artifact: native XGBoost model plus an embedded feature schema
+#
+# An artifact is a directory holding
+#   model.ubj       the booster in XGBoost's native UBJSON format (no pickle)
+#   manifest.json   format version, ordered feature schema (dtype and range per
+#                   feature), label map, objective and the model's SHA-256
+#
+# Usage:
+#   python artifact.py convert risk_level_xgb_model.pkl columns.json out_dir \
+#       --labels "Low Risk,Mid Risk,High Risk"
+#   python artifact.py inspect out_dir
+#   python artifact.py self-check           # convert the shipped pickle and load it back
+import argparse
+import hashlib
+import json
+import os
+import sys
+import warnings
+from datetime import datetime, timezone
+
+import numpy as np
+import xgboost as xgb
+
+FORMAT_VERSION = 1
+MODEL_FILE = 'model.ubj'
+MANIFEST_FILE = 'manifest.json'
+
+
+class SchemaMismatchError(ValueError):
+    pass
+
+
+class SchemaMismatchWarning(UserWarning):
+    pass
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def is_artifact(path):
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, MANIFEST_FILE))
+
+
+def feature_schema(frame):
+    """Schema entries (name, dtype, min, max) for the columns of a training frame."""
+    schema = []
+    for name in frame.columns:
+        values = frame[name]
+        schema.append({
+            'name': name,
+            'dtype': 'int' if np.issubdtype(values.dtype, np.integer) else 'float',
+            'min': float(values.min()),
+            'max': float(values.max()),
+        })
+    return schema
+
+
+def save_artifact(booster, path, features, label_map, metadata=None):
+    """Write booster and manifest into directory path.
+
+    features is a list of schema entries (see feature_schema) in model
+    column order; label_map maps every class code to its label.
+    """
+    names = [feature['name'] for feature in features]
+    if booster.feature_names is not None and list(booster.feature_names) != names:
+        raise SchemaMismatchError(f"Booster features {booster.feature_names} do not match schema {names}")
+    config = json.loads(booster.save_config())
+    n_classes = max(int(config['learner']['learner_model_param'].get('num_class', 0)), 2)
+    missing = [code for code in range(n_classes) if code not in label_map]
+    if missing:
+        raise SchemaMismatchError(f"Label map {label_map} has no label for classes {missing}")
+
+    os.makedirs(path, exist_ok=True)
+    model_path = os.path.join(path, MODEL_FILE)
+    # Name the features on a copy, leaving the caller's booster as it was
+    booster = booster.copy()
+    booster.feature_names = names
+    booster.save_model(model_path)
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'created': datetime.now(timezone.utc).isoformat(),
+        'features': features,
+        'label_map': {str(code): label for code, label in sorted(label_map.items())},
+        'n_classes': n_classes,
+        'objective': config['learner']['objective']['name'],
+        'model_sha256': _sha256(model_path),
+        'metadata': metadata or {},
+    }
+    with open(os.path.join(path, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return path
+
+
+class RiskArtifact:
+    """A loaded artifact.
+
+    Exposes the subset of the XGBClassifier interface the app relies on
+    (predict, predict_proba, get_booster), so it can stand in for the
+    unpickled model anywhere in risk_model.
+    """
+
+    def __init__(self, booster, manifest):
+        self.booster = booster
+        self.manifest = manifest
+        self.features = [feature['name'] for feature in manifest['features']]
+        self.label_map = {int(code): label for code, label in manifest['label_map'].items()}
+        self.n_classes_ = manifest['n_classes']
+        self.feature_names_in_ = np.array(self.features, dtype=object)
+
+    def get_booster(self):
+        return self.booster
+
+    def check_fields(self, fields):
+        """Check fields against the schema; returns the fields the model ignores.
+
+        A model feature missing from fields raises SchemaMismatchError.
+        Extra fields can still be scored (prepare_features drops them), but
+        they mean the inputs and the model have drifted apart, so they are
+        reported with a SchemaMismatchWarning.
+        """
+        missing = [name for name in self.features if name not in fields]
+        if missing:
+            raise SchemaMismatchError(f"Input fields do not supply the model features {missing}")
+        ignored = [name for name in fields if name not in self.features]
+        if ignored:
+            warnings.warn(f"The model ignores the input fields {ignored}", SchemaMismatchWarning, stacklevel=2)
+        return ignored
+
+    def predict_proba(self, features):
+        if list(features.columns) != self.features:
+            raise SchemaMismatchError(f"Expected columns {self.features}, got {list(features.columns)}")
+        out = self.booster.inplace_predict(features.to_numpy(dtype=np.float32), validate_features=False)
+        out = np.asarray(out, dtype=np.float64)
+        if out.ndim == 1:
+            return np.column_stack([1.0 - out, out])
+        return out
+
+    def predict(self, features):
+        return np.argmax(self.predict_proba(features), axis=1)
+
+
+def load_artifact(path, verify_hash=True):
+    """Load an artifact without unpickling anything; fails loudly on any mismatch."""
+    with open(os.path.join(path, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    if manifest.get('format_version') != FORMAT_VERSION:
+        raise SchemaMismatchError(f"Unsupported artifact format {manifest.get('format_version')}")
+
+    model_path = os.path.join(path, MODEL_FILE)
+    if verify_hash and _sha256(model_path) != manifest['model_sha256']:
+        raise SchemaMismatchError(f"{model_path} does not match the hash recorded in its manifest")
+    booster = xgb.Booster(model_file=model_path)
+
+    names = [feature['name'] for feature in manifest['features']]
+    if list(booster.feature_names or []) != names:
+        raise SchemaMismatchError(f"Model features {booster.feature_names} do not match manifest {names}")
+    if booster.num_features() != len(names):
+        raise SchemaMismatchError(f"Model expects {booster.num_features()} features, manifest lists {len(names)}")
+    return RiskArtifact(booster, manifest)
+
+
+def convert_pickle(model_path, columns_path, out_dir, label_map, ranges=None):
+    """Convert a joblib-pickled XGBClassifier plus columns.json into an artifact."""
+    import joblib
+
+    model = joblib.load(model_path)
+    with open(columns_path) as f:
+        columns = json.load(f)
+    ranges = ranges or {}
+    features = [
+        {
+            'name': name,
+            'dtype': 'float',
+            'min': ranges.get(name, {}).get('min'),
+            'max': ranges.get(name, {}).get('max'),
+        }
+        for name in columns
+    ]
+    booster = model.get_booster()
+    return save_artifact(booster, out_dir, features, label_map, {'converted_from': os.path.basename(model_path)})
+
+
+def self_check(model_path, columns_path, dataset, log=sys.stderr):
+    """Convert a pickle, load the artifact as the app does, and compare predictions; returns an exit code."""
+    import tempfile
+
+    import pandas as pd
+
+    from risk_model import INPUT_FIELDS, ArtifactCache, load_columns, load_model, prepare_features, risk_label
+
+    model = load_model(model_path)
+    columns = load_columns(columns_path)
+    label_map = {code: risk_label(code) for code in range(model.n_classes_)}
+    frame = pd.read_csv(dataset)[INPUT_FIELDS]
+    with tempfile.TemporaryDirectory() as out_dir:
+        convert_pickle(model_path, columns_path, out_dir, label_map)
+        artifact, artifact_columns = ArtifactCache(out_dir).get()
+        expected = model.predict_proba(prepare_features(frame, columns))
+        actual = artifact.predict_proba(prepare_features(frame, artifact_columns))
+    mismatches = int((np.abs(actual - expected) > 1e-6).any(axis=1).sum())
+    print(f"{len(frame) - mismatches}/{len(frame)} rows match between {os.path.basename(model_path)} "
+          f"and its converted artifact", file=log)
+    return 1 if mismatches else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create or inspect native model artifacts.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    convert = commands.add_parser('convert', help="Convert a pickled model and columns.json")
+    convert.add_argument('model')
+    convert.add_argument('columns')
+    convert.add_argument('out_dir')
+    convert.add_argument('--labels', help="Comma-separated class labels in code order (default: risk_map)")
+    inspect = commands.add_parser('inspect', help="Load an artifact and print its manifest")
+    inspect.add_argument('path')
+    check = commands.add_parser('self-check', help="Round-trip a pickle through convert and load")
+    check.add_argument('--model', default='risk_level_xgb_model.pkl')
+    check.add_argument('--columns', default='columns.json')
+    check.add_argument('--dataset', default='Dataset - Updated.csv')
+    args = parser.parse_args(argv)
+
+    if args.command == 'convert':
+        from risk_model import feature_stats, risk_map
+
+        label_map = dict(enumerate(args.labels.split(','))) if args.labels else risk_map
+        try:
+            convert_pickle(args.model, args.columns, args.out_dir, label_map, feature_stats)
+        except SchemaMismatchError as exc:
+            sys.exit(f"error: {exc}")
+        print(f"Wrote {args.out_dir}")
+    elif args.command == 'self-check':
+        sys.exit(self_check(args.model, args.columns, args.dataset))
+    else:
+        artifact = load_artifact(args.path)
+        print(json.dumps(artifact.manifest, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,412 @@
+# Headless cohort scoring: stream a CSV through the model in fixed-size chunks
+#
+# Usage:
+#   python batch_score.py "Dataset - Updated.csv" scored.csv
+#   python batch_score.py export.csv scored.parquet --chunksize 100000
+#   python batch_score.py registry.csv scored.csv --workers 8   # sharded, multi-process
+#   python batch_score.py registry.csv scored.csv --cascade     # clear-cut rows by rule (see cascade.py)
+import argparse
+import collections
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from cascade import CascadeScorer, load_rules
+from dataset import iter_dataset
+from drift import DriftMonitor, load_reference
+from explain import explain_frame, top_drivers_frame
+from recommendations import thresholds, generate_recommendations_frame
+from prediction_cache import DEFAULT_MAXSIZE, PredictionCache
+from risk_model import (
+    COLUMNS_PATH,
+    INPUT_FIELDS,
+    MODEL_PATH,
+    ArtifactCache,
+    predict_frame,
+    risk_label,
+)
+
+DEFAULT_CHUNKSIZE = 50_000
+DEFAULT_MAX_RETRIES = 2
+SHARDS_PER_WORKER = 4
+
+
+def score_chunk(model, columns, chunk, explain=False, cache=None, cascade=None):
+    """Return chunk with predicted risk and recommendations appended.
+
+    With a CascadeScorer, rows its rules resolve skip the model, and a
+    ResolvedBy column names the rule (empty for model-scored rows).
+    """
+    missing = [field for field in INPUT_FIELDS if field not in chunk.columns]
+    if missing:
+        raise ValueError(f"Input is missing required columns: {missing}")
+
+    resolved_by = None
+    if cascade is not None:
+        codes, resolved_by = cascade.predict(chunk)
+        recommendations = generate_recommendations_frame(chunk, thresholds)
+    elif cache is not None:
+        codes, _, recommendations = cache.score_frame(chunk)
+    else:
+        codes = predict_frame(model, chunk[INPUT_FIELDS], columns)
+        recommendations = generate_recommendations_frame(chunk, thresholds)
+    scored = chunk.copy()
+    scored['PredictedRiskCode'] = codes
+    labels = {code: risk_label(code, model) for code in scored['PredictedRiskCode'].unique().tolist()}
+    scored['PredictedRisk'] = scored['PredictedRiskCode'].map(labels)
+    scored['Recommendations'] = recommendations
+    if resolved_by is not None:
+        # str dtype, so Parquet gets a string column even if no row of a chunk was resolved
+        scored['ResolvedBy'] = pd.Series(resolved_by, index=chunk.index, dtype='str')
+    if explain:
+        contributions = explain_frame(model, columns, chunk[INPUT_FIELDS])
+        scored['TopDrivers'] = top_drivers_frame(contributions)
+    return scored
+
+
+class _CsvSink:
+    def __init__(self, path):
+        self.path = path
+        self.header = True
+
+    def write(self, frame):
+        frame.to_csv(self.path, mode='w' if self.header else 'a', header=self.header, index=False)
+        self.header = False
+
+    def close(self):
+        pass
+
+
+class _ParquetSink:
+    def __init__(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as exc:
+            raise SystemExit("Parquet output requires pyarrow (pip install pyarrow)") from exc
+        self._pa = pa
+        self._pq = pq
+        self.path = path
+        self.writer = None
+
+    def write(self, frame):
+        if self.writer is None:
+            table = self._pa.Table.from_pandas(frame, preserve_index=False)
+            self.writer = self._pq.ParquetWriter(self.path, table.schema)
+        else:
+            # Later chunks are cast to the schema fixed by the first one
+            table = self._pa.Table.from_pandas(frame, schema=self.writer.schema, preserve_index=False)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def _is_parquet(path):
+    return path.lower().endswith(('.parquet', '.pq'))
+
+
+def _open_sink(path):
+    if _is_parquet(path):
+        return _ParquetSink(path)
+    return _CsvSink(path)
+
+
+def score_file(input_path, output_path, chunksize=DEFAULT_CHUNKSIZE,
+               model_path=MODEL_PATH, columns_path=COLUMNS_PATH, explain=False,
+               cache_size=DEFAULT_MAXSIZE, cached=False, drift_report=None, cascade=False, log=sys.stderr):
+    """Score input_path chunk by chunk; only one chunk is held in memory.
+
+    With cached, rows are read from the typed dataset cache (see dataset.py)
+    instead of parsing the CSV text. With drift_report, the inputs' drift
+    against the training data (see drift.py) is written there as JSON. With
+    cascade, calibrated guideline rules resolve clear-cut rows before the
+    model (see cascade.py); the prediction cache is not used then.
+    """
+    artifacts = ArtifactCache(model_path, columns_path)
+    # Repeat vectors across the file are scored once while they stay in the LRU
+    cache = PredictionCache(cache_size, artifacts) if cache_size > 0 and not cascade else None
+    scorer = CascadeScorer(load_rules(artifacts=artifacts), artifacts) if cascade else None
+    monitor = DriftMonitor(load_reference()) if drift_report else None
+    start = time.perf_counter()
+    total_rows = _score_stream(input_path, output_path, artifacts, cache, chunksize, explain, log, cached, monitor,
+                               scorer)
+
+    elapsed = time.perf_counter() - start
+    rate = total_rows / max(elapsed, 1e-9)
+    print(f"Scored {total_rows} rows in {elapsed:.2f}s ({rate:,.0f} rows/s)", file=log)
+    if cache is not None:
+        print(f"Prediction cache: {cache.stats()}", file=log)
+    if monitor is not None:
+        _write_drift_report(monitor, drift_report, log)
+    return {'rows': total_rows, 'seconds': elapsed, 'rows_per_second': rate}
+
+
+def _write_drift_report(monitor, path, log):
+    report = monitor.report()
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    status = f"ALERT, drifted: {', '.join(report['drifted'])}" if report['alert'] else "no alert"
+    print(f"Input drift: {status} ({path})", file=log)
+
+
+def _score_stream(source, output_path, artifacts, cache, chunksize, explain, log=None, cached=False,
+                  monitor=None, cascade=None):
+    """Score a CSV path or binary stream into output_path; returns the row count."""
+    model, columns = artifacts.get()
+    sink = _open_sink(output_path)
+    # Parquet needs every chunk on the same schema, so pin the numeric dtypes
+    dtype = {field: 'float64' for field in INPUT_FIELDS} if isinstance(sink, _ParquetSink) else None
+    total_rows = 0
+    try:
+        if cached:
+            chunks = (chunk.astype(dtype) if dtype else chunk for chunk in iter_dataset(source, chunksize))
+        else:
+            chunks = pd.read_csv(source, chunksize=chunksize, dtype=dtype)
+        for i, chunk in enumerate(chunks):
+            chunk_start = time.perf_counter()
+            sink.write(score_chunk(model, columns, chunk, explain, cache, cascade))
+            if monitor is not None:
+                monitor.update(chunk)
+            total_rows += len(chunk)
+            elapsed = time.perf_counter() - chunk_start
+            if log is not None:
+                print(
+                    f"chunk {i}: {len(chunk)} rows in {elapsed:.2f}s "
+                    f"({len(chunk) / max(elapsed, 1e-9):,.0f} rows/s)",
+                    file=log,
+                )
+    finally:
+        sink.close()
+    return total_rows
+
+
+class _RangeReader(io.RawIOBase):
+    """Binary stream of a CSV header followed by bytes [start, end) of a file."""
+
+    def __init__(self, path, header, start, end):
+        self._file = open(path, 'rb')
+        self._file.seek(start)
+        self._prefix = header
+        self._remaining = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._prefix:
+            n = min(len(buffer), len(self._prefix))
+            buffer[:n] = self._prefix[:n]
+            self._prefix = self._prefix[n:]
+            return n
+        n = min(len(buffer), self._remaining)
+        if n <= 0:
+            return 0
+        data = self._file.read(n)
+        buffer[:len(data)] = data
+        self._remaining -= len(data)
+        return len(data)
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+def shard_ranges(path, shards):
+    """Header line plus (start, end) byte ranges that split the rows of path.
+
+    Boundaries are moved forward to the next line start, so each row lands
+    in exactly one shard. Assumes no quoted field contains a newline, which
+    holds for numeric exports shaped like 'Dataset - Updated.csv'.
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        header = f.readline()
+        first = f.tell()
+        bounds = [first]
+        for i in range(1, shards):
+            f.seek(max(first + (size - first) * i // shards - 1, bounds[-1]))
+            f.readline()
+            position = f.tell()
+            if position >= size:
+                break
+            if position > bounds[-1]:
+                bounds.append(position)
+    bounds.append(size)
+    return header, [(start, end) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+
+# Per-process state of a sharded run, loaded once by _init_worker
+_worker_state = {}
+
+
+def _init_worker(model_path, columns_path, cache_size, reference=None, rules=None):
+    artifacts = ArtifactCache(model_path, columns_path)
+    artifacts.get()
+    _worker_state['artifacts'] = artifacts
+    _worker_state['cache'] = PredictionCache(cache_size, artifacts) if cache_size > 0 and not rules else None
+    _worker_state['monitor'] = DriftMonitor(reference) if reference else None
+    _worker_state['cascade'] = CascadeScorer(rules, artifacts) if rules else None
+
+
+def _score_shard(index, input_path, header, start, end, part_path, chunksize, explain):
+    shard_start = time.perf_counter()
+    monitor = _worker_state['monitor']
+    if monitor is not None:
+        # Counts are returned per shard, so a retried shard is not counted twice
+        monitor.reset()
+    with _RangeReader(input_path, header, start, end) as stream:
+        rows = _score_stream(
+            io.BufferedReader(stream), part_path, _worker_state['artifacts'], _worker_state['cache'],
+            chunksize, explain, monitor=monitor, cascade=_worker_state['cascade'],
+        )
+    return {'shard': index, 'rows': rows, 'bytes': end - start, 'seconds': time.perf_counter() - shard_start,
+            'pid': os.getpid(), 'drift': monitor.state() if monitor is not None else None}
+
+
+def _merge_parts(part_paths, output_path):
+    # Concatenate shard outputs in shard order
+    if _is_parquet(output_path):
+        import pyarrow.parquet as pq
+
+        writer = None
+        try:
+            for part in part_paths:
+                if not os.path.exists(part):
+                    continue
+                parquet = pq.ParquetFile(part)
+                if writer is None:
+                    writer = pq.ParquetWriter(output_path, parquet.schema_arrow)
+                for batch in parquet.iter_batches():
+                    writer.write_batch(batch)
+        finally:
+            if writer is not None:
+                writer.close()
+        return
+
+    with open(output_path, 'wb') as out:
+        header_written = False
+        for part in part_paths:
+            if not os.path.exists(part):
+                continue
+            with open(part, 'rb') as f:
+                header = f.readline()
+                if not header_written:
+                    out.write(header)
+                    header_written = True
+                shutil.copyfileobj(f, out)
+
+
+def score_file_sharded(input_path, output_path, workers, chunksize=DEFAULT_CHUNKSIZE,
+                       model_path=MODEL_PATH, columns_path=COLUMNS_PATH, explain=False,
+                       cache_size=DEFAULT_MAXSIZE, shards=None, max_retries=DEFAULT_MAX_RETRIES,
+                       drift_report=None, cascade=False, log=sys.stderr):
+    """Score input_path across a process pool, one byte-range shard per task.
+
+    Each worker loads the model once in its initializer. Shards are written
+    to part files and merged in input order. If a worker dies, the pool is
+    rebuilt and unfinished shards are retried up to max_retries times each.
+    """
+    shards = shards or workers * SHARDS_PER_WORKER
+    header, ranges = shard_ranges(input_path, shards)
+    suffix = '.parquet' if _is_parquet(output_path) else '.csv'
+    part_dir = tempfile.mkdtemp(prefix='.shards-', dir=os.path.dirname(os.path.abspath(output_path)))
+    part_paths = [os.path.join(part_dir, f"part-{i:05d}{suffix}") for i in range(len(ranges))]
+    # Workers count inputs per shard; the counts are merged here
+    reference = load_reference() if drift_report else None
+    monitor = DriftMonitor(reference) if reference else None
+    # Rules are calibrated (or loaded) once here rather than in every worker
+    rules = load_rules(artifacts=ArtifactCache(model_path, columns_path)) if cascade else None
+
+    start = time.perf_counter()
+    pending = set(range(len(ranges)))
+    attempts = collections.Counter()
+    results = {}
+    try:
+        while pending:
+            with ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_worker,
+                initargs=(model_path, columns_path, cache_size, reference, rules),
+            ) as pool:
+                futures = {
+                    pool.submit(_score_shard, i, input_path, header, *ranges[i], part_paths[i], chunksize, explain): i
+                    for i in sorted(pending)
+                }
+                for future in as_completed(futures):
+                    i = futures[future]
+                    try:
+                        stats = future.result()
+                    except Exception as exc:
+                        attempts[i] += 1
+                        if attempts[i] > max_retries:
+                            raise RuntimeError(f"Shard {i} failed {attempts[i]} times") from exc
+                        print(f"shard {i}: failed ({exc!r}), retrying", file=log)
+                        continue
+                    pending.discard(i)
+                    if monitor is not None:
+                        monitor.merge(stats.pop('drift'))
+                    results[i] = stats
+                    print(
+                        f"shard {i}: {stats['rows']} rows in {stats['seconds']:.2f}s "
+                        f"({stats['rows'] / max(stats['seconds'], 1e-9):,.0f} rows/s, pid {stats['pid']})",
+                        file=log,
+                    )
+        _merge_parts(part_paths, output_path)
+    finally:
+        shutil.rmtree(part_dir, ignore_errors=True)
+
+    elapsed = time.perf_counter() - start
+    total_rows = sum(stats['rows'] for stats in results.values())
+    rate = total_rows / max(elapsed, 1e-9)
+    print(f"Scored {total_rows} rows in {len(ranges)} shards on {workers} workers "
+          f"in {elapsed:.2f}s ({rate:,.0f} rows/s)", file=log)
+    if monitor is not None:
+        _write_drift_report(monitor, drift_report, log)
+    return {'rows': total_rows, 'seconds': elapsed, 'rows_per_second': rate,
+            'shards': [results[i] for i in sorted(results)]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a patient CSV with the risk model in chunks.")
+    parser.add_argument('input', help="CSV shaped like 'Dataset - Updated.csv'")
+    parser.add_argument('output', help="Output path; .parquet writes Parquet, anything else CSV")
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE, help="Rows per chunk")
+    parser.add_argument('--model', default=MODEL_PATH, help="Path to the trained model")
+    parser.add_argument('--columns', default=COLUMNS_PATH, help="Path to the feature column list")
+    parser.add_argument('--explain', action='store_true', help="Add the top SHAP drivers for each row")
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_MAXSIZE,
+                        help="Prediction cache entries (0 disables the cache)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Worker processes; above 1 the input is split into shards scored in parallel")
+    parser.add_argument('--shards', type=int, help=f"Shard count (default {SHARDS_PER_WORKER} per worker)")
+    parser.add_argument('--max-retries', type=int, default=DEFAULT_MAX_RETRIES,
+                        help="Retries per shard after a worker failure")
+    parser.add_argument('--cached', action='store_true',
+                        help="Read the input through the typed dataset cache (single process only)")
+    parser.add_argument('--drift-report', help="Write a JSON drift report of the inputs here (see drift.py)")
+    parser.add_argument('--cascade', action='store_true',
+                        help="Resolve clear-cut rows with calibrated guideline rules before the model (see cascade.py)")
+    args = parser.parse_args(argv)
+
+    if args.workers > 1 and args.cached:
+        parser.error("--cached reads the cache in one process; drop --workers")
+    if args.workers > 1:
+        score_file_sharded(
+            args.input, args.output, args.workers, args.chunksize, args.model, args.columns,
+            args.explain, args.cache_size, args.shards, args.max_retries, args.drift_report, args.cascade,
+        )
+    else:
+        score_file(args.input, args.output, args.chunksize, args.model, args.columns, args.explain, args.cache_size,
+                   args.cached, args.drift_report, args.cascade)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,305 @@
+# Benchmark suite for the app's hot paths, on synthetic inputs drawn from feature_stats
+#
+# Usage:
+#   python bench.py --output bench.json            # full run (batch sizes 1k/100k/1M)
+#   python bench.py --quick --output bench.json    # small sizes, for a fast check
+#   python bench.py --compare old.json new.json    # flag regressions between two runs
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from artifact import convert_pickle, is_artifact
+from recommendations import thresholds, generate_recommendations, generate_recommendations_frame
+from risk_model import (
+    COLUMNS_PATH,
+    INPUT_FIELDS,
+    MODEL_PATH,
+    ArtifactCache,
+    FastPredictor,
+    feature_stats,
+    load_model,
+    predict_frame,
+)
+
+BATCH_SIZES = [1_000, 100_000, 1_000_000]
+QUICK_BATCH_SIZES = [1_000, 10_000]
+REGRESSION_TOLERANCE = 0.10
+
+# Inputs feature_stats does not describe, taken from the app's widgets and the dataset
+EXTRA_STATS = {
+    'BMI': {'mean': 23.34, 'std': 3.89, 'min': 10.0, 'max': 50.0},
+}
+FLAG_RATES = {
+    'Previous Complications': 0.18,
+    'Preexisting Diabetes': 0.29,
+    'Gestational Diabetes': 0.12,
+    'Mental Health': 0.33,
+}
+ONE_DECIMAL_FIELDS = {'BS', 'BodyTemp', 'BMI'}
+
+
+def synthetic_inputs(n, seed=0):
+    """n input rows drawn from clipped normals at the app's recording precision."""
+    rng = np.random.default_rng(seed)
+    stats = dict(feature_stats, **EXTRA_STATS)
+    data = {}
+    for field in INPUT_FIELDS:
+        if field in FLAG_RATES:
+            data[field] = (rng.random(n) < FLAG_RATES[field]).astype(np.int64)
+            continue
+        s = stats[field]
+        values = np.clip(rng.normal(s['mean'], s['std'], n), s['min'], s['max'])
+        data[field] = values.round(1) if field in ONE_DECIMAL_FIELDS else values.round().astype(np.int64)
+    return pd.DataFrame(data, columns=INPUT_FIELDS)
+
+
+def _best_of(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def _legacy_prepare(user_input, columns):
+    # The app's original per-click preprocessing
+    manual_input_df = pd.DataFrame([user_input])
+    manual_input_df = pd.get_dummies(manual_input_df)
+    for col in columns:
+        if col not in manual_input_df.columns:
+            manual_input_df[col] = 0
+    return manual_input_df[columns]
+
+
+def bench_cold_start(repeat):
+    code = (
+        "import time; t = time.perf_counter(); "
+        "import streamlit, pandas, joblib, xgboost; t1 = time.perf_counter(); "
+        "from risk_model import load_model, load_columns; load_model(); load_columns(); "
+        "t2 = time.perf_counter(); print(t1 - t, t2 - t1)"
+    )
+    imports, loads = [], []
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, '-W', 'ignore', '-c', code], capture_output=True, text=True, check=True
+        ).stdout.split()
+        imports.append(float(out[0]))
+        loads.append(float(out[1]))
+    return [
+        {'name': 'cold_import', 'unit': 's', 'value': min(imports)},
+        {'name': 'cold_model_load', 'unit': 's', 'value': min(loads)},
+    ]
+
+
+def _cold_seconds(code, repeat):
+    times = []
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, '-W', 'ignore', '-c', code], capture_output=True, text=True, check=True
+        ).stdout
+        times.append(float(out))
+    return min(times)
+
+
+def bench_artifact_load(repeat):
+    # Fresh-interpreter import + load: pickled model vs native artifact (see artifact.py)
+    if is_artifact(MODEL_PATH):
+        return []
+    model = load_model(MODEL_PATH)
+    n_classes = int(getattr(model, 'n_classes_', 2))
+    with tempfile.TemporaryDirectory() as path:
+        convert_pickle(MODEL_PATH, COLUMNS_PATH, path, {code: f'class {code}' for code in range(n_classes)})
+        timer = "import time; t = time.perf_counter(); {}; print(time.perf_counter() - t)"
+        pickle_load = _cold_seconds(timer.format(f"import joblib; joblib.load({MODEL_PATH!r})"), repeat)
+        artifact_load = _cold_seconds(
+            timer.format(f"from artifact import load_artifact; load_artifact({path!r})"), repeat
+        )
+    return [
+        {'name': 'cold_pickle_import_and_load', 'unit': 's', 'value': pickle_load},
+        {'name': 'cold_artifact_import_and_load', 'unit': 's', 'value': artifact_load},
+    ]
+
+
+def bench_single_row(model, columns, rows, repeat):
+    records = synthetic_inputs(rows, seed=1).to_dict('records')
+    predictor = FastPredictor(model, columns)
+
+    def legacy():
+        for record in records:
+            model.predict(_legacy_prepare(record, columns))
+
+    def fast():
+        for record in records:
+            predictor.predict_one(record)
+
+    return [
+        {'name': 'single_row_dataframe_predict', 'unit': 'us/row', 'value': _best_of(legacy, repeat) / rows * 1e6},
+        {'name': 'single_row_fast_predict', 'unit': 'us/row', 'value': _best_of(fast, repeat) / rows * 1e6},
+    ]
+
+
+def bench_batch_predict(model, columns, sizes, repeat):
+    results = []
+    for n in sizes:
+        frame = synthetic_inputs(n, seed=2)
+        seconds = _best_of(lambda: predict_frame(model, frame, columns), repeat)
+        results.append({'name': f'batch_predict_{n}', 'unit': 'rows/s', 'value': n / seconds})
+    return results
+
+
+def bench_recommendations(rows, repeat):
+    frame = synthetic_inputs(rows, seed=3)
+    scalar = _best_of(lambda: frame.apply(lambda row: generate_recommendations(row, thresholds), axis=1), repeat)
+    vectorized = _best_of(lambda: generate_recommendations_frame(frame, thresholds), repeat)
+    return [
+        {'name': 'recommendations_scalar_apply', 'unit': 'rows/s', 'value': rows / scalar},
+        {'name': 'recommendations_vectorized', 'unit': 'rows/s', 'value': rows / vectorized},
+    ]
+
+
+def bench_rerun(repeat):
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file('preghealth.py', default_timeout=60)
+    runs = 0
+
+    def run(target):
+        # One script run, which must finish without an exception
+        nonlocal runs
+        target.run()
+        runs += 1
+        if app.exception:
+            raise RuntimeError(f"preghealth.py raised: {app.exception[0].message}")
+
+    start = time.perf_counter()
+    run(app)
+    first = time.perf_counter() - start
+
+    ages = iter(range(20, 20 + 2 * repeat))
+    widget = _best_of(lambda: run(app.number_input[0].set_value(next(ages))), repeat)
+    predict = _best_of(lambda: run(app.button[0].click()), repeat)
+
+    # A browser reruns the script on every widget change, except for widgets
+    # inside a form, which only rerun it on submit. A session edits the six
+    # vitals and predicts; count the runs it triggers and their CPU time.
+    def session(step):
+        for widget in list(app.number_input)[:6]:
+            widget.set_value(widget.value + step)
+            if not widget.form_id:
+                run(app)
+        run(app.button[0].click())
+
+    cpu = []
+    session_runs = []
+    for i in range(repeat):
+        runs = 0
+        start = time.process_time()
+        session(1 if i % 2 == 0 else -1)
+        cpu.append(time.process_time() - start)
+        session_runs.append(runs)
+    return [
+        {'name': 'rerun_first_script_run', 'unit': 's', 'value': first},
+        {'name': 'rerun_widget_change', 'unit': 's', 'value': widget},
+        {'name': 'rerun_predict_click', 'unit': 's', 'value': predict},
+        {'name': 'rerun_prediction_session_cpu', 'unit': 's', 'value': min(cpu)},
+        {'name': 'reruns_per_prediction', 'unit': 'runs', 'value': max(session_runs)},
+    ]
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(quick=False, repeat=3, log=sys.stderr):
+    model, columns = ArtifactCache().get()
+    sizes = QUICK_BATCH_SIZES if quick else BATCH_SIZES
+    suites = [
+        ('cold start', lambda: bench_cold_start(repeat)),
+        ('artifact load', lambda: bench_artifact_load(repeat)),
+        ('single row', lambda: bench_single_row(model, columns, 100 if quick else 1_000, repeat)),
+        ('batch predict', lambda: bench_batch_predict(model, columns, sizes, repeat)),
+        ('recommendations', lambda: bench_recommendations(10_000 if quick else 100_000, repeat)),
+        ('rerun', lambda: bench_rerun(repeat)),
+    ]
+    results = []
+    for label, suite in suites:
+        print(f"Running {label} benchmarks...", file=log)
+        results.extend(suite())
+    return {
+        'commit': _git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'quick': quick,
+        'results': results,
+    }
+
+
+def _higher_is_better(unit):
+    return unit.endswith('/s')
+
+
+def compare(old, new, tolerance=REGRESSION_TOLERANCE):
+    """Rows of (name, old, new, ratio, regressed) for benchmarks present in both runs.
+
+    ratio > 1 always means the new run is faster.
+    """
+    old_results = {r['name']: r for r in old['results']}
+    rows = []
+    for result in new['results']:
+        before = old_results.get(result['name'])
+        if before is None:
+            continue
+        if _higher_is_better(result['unit']):
+            ratio = result['value'] / before['value']
+        else:
+            ratio = before['value'] / result['value']
+        rows.append((result['name'], before['value'], result['value'], ratio, ratio < 1 - tolerance))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the maternal risk app's hot paths.")
+    parser.add_argument('--quick', action='store_true', help="Use small sizes for a fast run")
+    parser.add_argument('--repeat', type=int, default=3, help="Repeats per benchmark (best is kept)")
+    parser.add_argument('--output', help="Write JSON results here instead of stdout")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help="Compare two result files")
+    parser.add_argument('--tolerance', type=float, default=REGRESSION_TOLERANCE,
+                        help="Slowdown fraction reported as a regression")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            old = json.load(f)
+        with open(args.compare[1]) as f:
+            new = json.load(f)
+        rows = compare(old, new, args.tolerance)
+        for name, before, after, ratio, regressed in rows:
+            flag = '  REGRESSION' if regressed else ''
+            print(f"{name:40s} {before:14.4g} -> {after:14.4g}  x{ratio:.2f}{flag}")
+        sys.exit(1 if any(row[4] for row in rows) else 0)
+
+    report = json.dumps(run(args.quick, args.repeat), indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + '\n')
+    else:
+        print(report)
+
+
+if __name__ == '__main__':
+    main()
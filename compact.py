@@ -0,0 +1,284 @@
+# Post-training compaction: drop boosting rounds the holdout metrics do not need
+#
+# Two passes over a trained model, both judged against the full model: on the
+# held-out rows of the dataset, accuracy and high-risk recall must stay within
+# tolerance, and on every row the predicted class must agree MIN_AGREEMENT of
+# the time (so a small holdout cannot license a model that scores differently):
+#   1. truncate: keep the shortest prefix of rounds that passes
+#   2. prune:    drop further rounds in order of increasing split gain while
+#                the model still passes
+# A round is one tree per class, so multi-class models lose whole rounds and
+# stay well formed. The compact model is written next to the full one with a
+# size and latency comparison.
+#
+# Usage:
+#   python compact.py artifacts/risk-model-<version>    # writes artifacts/risk-model-<version>-compact/
+#   python compact.py risk_level_xgb_model.pkl          # writes risk_level_xgb_model-compact.pkl
+#   python compact.py risk_level_xgb_model.pkl --tolerance 0.005
+import argparse
+import json
+import os
+import sys
+import time
+
+import joblib
+import numpy as np
+import xgboost as xgb
+from sklearn.model_selection import train_test_split
+
+from artifact import is_artifact, load_artifact, save_artifact as save_native_artifact
+from dataset import holdout_mask
+from risk_model import COLUMNS_PATH, load_columns
+from train import (
+    DATASET_PATH,
+    RANDOM_STATE,
+    TEST_SIZE,
+    _as_classifier,
+    classification_metrics,
+    load_training_data,
+)
+
+# Largest drop in holdout accuracy or high-risk recall compaction may cause
+COMPACT_TOLERANCE = 0.01
+# Smallest share of dataset rows on which the compact model must predict the full model's class
+MIN_AGREEMENT = 0.99
+# Rows the agreement is checked on (a seeded sample of larger datasets)
+AGREEMENT_ROWS = 50_000
+SUFFIX = '-compact'
+# Rows the throughput comparison predicts per call (the dataset is tiled up to this)
+BENCH_ROWS = 100_000
+SINGLE_ROW_CALLS = 2_000
+
+
+def _load(model_path, columns_path):
+    # (booster, feature names, metrics.json or {}) for an artifact or a pickle
+    if is_artifact(model_path):
+        artifact = load_artifact(model_path)
+        metrics_path = os.path.join(model_path, 'metrics.json')
+        metrics = {}
+        if os.path.exists(metrics_path):
+            with open(metrics_path) as f:
+                metrics = json.load(f)
+        return artifact.booster, artifact.features, metrics
+    return joblib.load(model_path).get_booster(), load_columns(columns_path), {}
+
+
+def holdout_rows(y, metrics):
+    """Test-set mask matching how the model was evaluated when it was trained.
+
+    Streaming artifacts used a hash holdout; everything else (train() and
+    the notebook) the seeded train_test_split.
+    """
+    if metrics.get('mode') == 'streaming':
+        return holdout_mask(np.arange(len(y)))
+    _, test = train_test_split(np.arange(len(y)), test_size=TEST_SIZE, random_state=RANDOM_STATE)
+    mask = np.zeros(len(y), dtype=bool)
+    mask[test] = True
+    return mask
+
+
+def round_margins(booster, X):
+    """Per-round margin contributions of shape (rounds, rows[, classes]) and the base margin."""
+    dmatrix = xgb.DMatrix(X, feature_names=booster.feature_names)
+    rounds = booster.num_boosted_rounds()
+    per_round = np.stack([
+        booster.predict(dmatrix, output_margin=True, iteration_range=(r, r + 1)) for r in range(rounds)
+    ]).astype(np.float64)
+    full = booster.predict(dmatrix, output_margin=True).astype(np.float64)
+    # Each single-round prediction is base + contribution; the full one base + all of them
+    base = (per_round.sum(axis=0) - full) / max(rounds - 1, 1)
+    return per_round - base, base
+
+
+def predicted_class(margin):
+    if margin.ndim == 1:
+        return (margin > 0).astype(np.int64)
+    return margin.argmax(axis=1)
+
+
+def high_risk(margin):
+    # Any class other than the lowest-risk one counts as high risk
+    return (predicted_class(margin) != 0).astype(np.int64)
+
+
+def round_gains(booster):
+    """Total split gain of each round's trees."""
+    model = json.loads(booster.save_raw('json'))['learner']['gradient_booster']['model']
+    indptr = model['iteration_indptr']
+    gains = []
+    for r in range(len(indptr) - 1):
+        gain = 0.0
+        for tree in model['trees'][indptr[r]:indptr[r + 1]]:
+            leaf = np.asarray(tree['left_children']) == -1
+            gain += float(np.asarray(tree['loss_changes'])[~leaf].sum())
+        gains.append(gain)
+    return np.asarray(gains)
+
+
+def select_rounds(booster, keep):
+    """A new booster holding only the given rounds, in their original order."""
+    raw = json.loads(booster.save_raw('json'))
+    model = raw['learner']['gradient_booster']['model']
+    indptr = model['iteration_indptr']
+    trees, tree_info, new_indptr = [], [], [0]
+    for r in sorted(keep):
+        for i in range(indptr[r], indptr[r + 1]):
+            tree = model['trees'][i]
+            tree['id'] = len(trees)
+            trees.append(tree)
+            tree_info.append(model['tree_info'][i])
+        new_indptr.append(len(trees))
+    model.update(trees=trees, tree_info=tree_info, iteration_indptr=new_indptr)
+    model['gbtree_model_param']['num_trees'] = str(len(trees))
+    compact = xgb.Booster()
+    compact.load_model(bytearray(json.dumps(raw).encode()))
+    return compact
+
+
+def compact_rounds(contributions, base, y, test, gains, tolerance=COMPACT_TOLERANCE, min_agreement=MIN_AGREEMENT):
+    """(prefix length, rounds to keep) for contributions over rows whose test subset is labelled y."""
+    full = base + contributions.sum(axis=0)
+    target = classification_metrics(y, high_risk(full[test]))
+    full_class = predicted_class(full)
+
+    def passes(margin):
+        if (predicted_class(margin) == full_class).mean() < min_agreement:
+            return False
+        metrics = classification_metrics(y, high_risk(margin[test]))
+        return (metrics['accuracy'] >= target['accuracy'] - tolerance
+                and metrics['recall_high_risk'] >= target['recall_high_risk'] - tolerance)
+
+    rounds = len(contributions)
+    margin = base.copy()
+    for prefix in range(1, rounds + 1):
+        margin += contributions[prefix - 1]
+        if passes(margin):
+            break
+    keep = list(range(prefix))
+    for r in sorted(keep, key=lambda r: gains[r]):
+        rest = [k for k in keep if k != r]
+        if rest and passes(margin - contributions[r]):
+            keep = rest
+            margin = margin - contributions[r]
+    return prefix, keep
+
+
+def _model_bytes(booster):
+    return len(booster.save_raw('ubj'))
+
+
+def latency(booster, X, rows=BENCH_ROWS, calls=SINGLE_ROW_CALLS):
+    """Median single-row predict latency and batch throughput with inplace_predict."""
+    one = X[:1]
+    booster.inplace_predict(one, validate_features=False)
+    times = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        booster.inplace_predict(one, validate_features=False)
+        times.append(time.perf_counter() - start)
+    batch = np.tile(X, (-(-rows // len(X)), 1))[:rows]
+    best = float('inf')
+    for _ in range(3):
+        start = time.perf_counter()
+        booster.inplace_predict(batch, validate_features=False)
+        best = min(best, time.perf_counter() - start)
+    return {'single_row_us': float(np.median(times) * 1e6), 'batch_rows_per_second': rows / best}
+
+
+def _summary(booster, X_test, y_test, X_all):
+    metrics = classification_metrics(y_test, high_risk(booster.inplace_predict(X_test, predict_type='margin', validate_features=False)))
+    return {
+        'rounds': booster.num_boosted_rounds(),
+        'trees': len(booster.get_dump()),
+        'model_bytes': _model_bytes(booster),
+        'accuracy': metrics['accuracy'],
+        'recall_high_risk': metrics['recall_high_risk'],
+        **latency(booster, X_all),
+    }
+
+
+def compact_path(model_path):
+    """Where the compact model goes: a sibling artifact directory or pickle."""
+    if is_artifact(model_path):
+        return os.path.normpath(model_path) + SUFFIX
+    stem, ext = os.path.splitext(model_path)
+    return f"{stem}{SUFFIX}{ext}"
+
+
+def compact_model(model_path, dataset=DATASET_PATH, columns_path=COLUMNS_PATH, tolerance=COMPACT_TOLERANCE,
+                  min_agreement=MIN_AGREEMENT):
+    """Compact the model at model_path; returns (output path, comparison report)."""
+    start = time.perf_counter()
+    booster, features, metrics = _load(model_path, columns_path)
+    X, y = load_training_data(dataset)
+    X = X[features].to_numpy(dtype=np.float32)
+    y = y.to_numpy(dtype=np.int64)
+    test = holdout_rows(y, metrics)
+    # Holdout rows plus a sample of the rest for the agreement check
+    rows = np.flatnonzero(test)
+    others = np.flatnonzero(~test)
+    if len(others) > AGREEMENT_ROWS:
+        others = np.sort(np.random.default_rng(RANDOM_STATE).choice(others, AGREEMENT_ROWS, replace=False))
+    rows = np.concatenate([rows, others])
+
+    contributions, base = round_margins(booster, X[rows])
+    prefix, keep = compact_rounds(contributions, base, y[test], np.arange(len(rows)) < test.sum(),
+                                  round_gains(booster), tolerance, min_agreement)
+    compact = select_rounds(booster, keep)
+    compact.feature_names = booster.feature_names
+    elapsed = time.perf_counter() - start
+
+    full_codes = predicted_class(booster.inplace_predict(X, predict_type='margin', validate_features=False))
+    compact_codes = predicted_class(compact.inplace_predict(X, predict_type='margin', validate_features=False))
+    report = {
+        'source': os.path.basename(os.path.normpath(model_path)),
+        'dataset': os.path.basename(dataset),
+        'tolerance': tolerance,
+        'min_agreement': min_agreement,
+        'holdout_rows': int(test.sum()),
+        'truncated_to_rounds': prefix,
+        'kept_rounds': sorted(keep),
+        'agreement_with_full': float((full_codes == compact_codes).mean()),
+        'compact_seconds': elapsed,
+        'full': _summary(booster, X[test], y[test], X),
+        'compact': _summary(compact, X[test], y[test], X),
+    }
+
+    out_path = compact_path(model_path)
+    if is_artifact(model_path):
+        artifact = load_artifact(model_path)
+        save_native_artifact(compact, out_path, artifact.manifest['features'], artifact.label_map,
+                             dict(artifact.manifest['metadata'], compacted_from=report['source']))
+        with open(os.path.join(out_path, 'metrics.json'), 'w') as f:
+            json.dump(dict(metrics, compaction=report), f, indent=2)
+    else:
+        joblib.dump(_as_classifier(compact), out_path)
+        with open(os.path.splitext(out_path)[0] + '.json', 'w') as f:
+            json.dump(report, f, indent=2)
+    return out_path, report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prune a trained model within a holdout accuracy/recall budget.")
+    parser.add_argument('model', help="Artifact directory or pickled model")
+    parser.add_argument('--dataset', default=DATASET_PATH)
+    parser.add_argument('--columns', default=COLUMNS_PATH, help="Feature columns of a pickled model")
+    parser.add_argument('--tolerance', type=float, default=COMPACT_TOLERANCE,
+                        help="Largest holdout accuracy/recall drop allowed")
+    parser.add_argument('--min-agreement', type=float, default=MIN_AGREEMENT,
+                        help="Smallest share of rows that must keep the full model's predicted class")
+    args = parser.parse_args(argv)
+
+    out_path, report = compact_model(args.model, args.dataset, args.columns, args.tolerance, args.min_agreement)
+    full, compact = report['full'], report['compact']
+    print(f"{'':<22}{'full':>14}{'compact':>14}")
+    for key, fmt in [('rounds', '{:d}'), ('trees', '{:d}'), ('model_bytes', '{:,d}'), ('accuracy', '{:.3f}'),
+                     ('recall_high_risk', '{:.3f}'), ('single_row_us', '{:.1f}'),
+                     ('batch_rows_per_second', '{:,.0f}')]:
+        print(f"{key:<22}{fmt.format(full[key]):>14}{fmt.format(compact[key]):>14}")
+    print(f"Agreement with the full model on {report['dataset']}: {report['agreement_with_full']:.2%}; "
+          f"wrote {out_path}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,285 @@
+# Typed columnar cache of the patient dataset
+#
+# The CSV is parsed once, chunk by chunk, into a Parquet file under
+# .dataset_cache/ with int8 flags, float32 vitals and a categorical RiskLevel.
+# Later loads read the Parquet file instead of re-parsing text. The cache
+# records the source's size, mtime and SHA-256 and is rebuilt when the source
+# no longer matches.
+#
+# Usage:
+#   python dataset.py                         # build if stale, print timings and the validation report
+#   python dataset.py export.csv --rebuild
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from risk_model import INPUT_FIELDS, feature_stats
+
+DATASET_PATH = 'Dataset - Updated.csv'
+CACHE_DIR = '.dataset_cache'
+LABEL_COLUMN = 'RiskLevel'
+BUILD_CHUNKSIZE = 100_000
+METADATA_KEY = b'dataset_cache'
+# Hash split shared by streaming training, model updates and the cascade audit
+HOLDOUT_SIZE = 0.2
+HOLDOUT_SEED = 42
+
+FLAG_FIELDS = [
+    'Previous Complications',
+    'Preexisting Diabetes',
+    'Gestational Diabetes',
+    'Mental Health',
+]
+
+# Ranges checked by validate(): feature_stats plus the binary flags
+VALID_RANGES = dict(
+    {field: (stats['min'], stats['max']) for field, stats in feature_stats.items()},
+    **{field: (0, 1) for field in FLAG_FIELDS},
+)
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_path(source, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, os.path.basename(source) + '.parquet')
+
+
+def _downcast(chunk):
+    # Flags become int8 when complete, other numbers float32, strings categorical
+    out = {}
+    for name, values in chunk.items():
+        if name in FLAG_FIELDS and not values.isna().any():
+            out[name] = values.astype(np.int8)
+        elif pd.api.types.is_numeric_dtype(values):
+            out[name] = values.astype(np.float32)
+        else:
+            out[name] = values.astype('string').astype('category')
+    return pd.DataFrame(out, index=chunk.index)
+
+
+def build_cache(source=DATASET_PATH, cache_dir=CACHE_DIR, chunksize=BUILD_CHUNKSIZE):
+    """Convert source to the typed Parquet cache and return its path.
+
+    The CSV is read in chunks, so memory is bounded by chunksize. The
+    dtypes pandas would infer for the whole CSV are recorded, so that
+    source_dtypes() can hand consumers the same frame read_csv would.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    path = cache_path(source, cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    stat = os.stat(source)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    writer = None
+    kinds = {}
+    try:
+        for chunk in pd.read_csv(source, chunksize=chunksize):
+            for name, values in chunk.items():
+                kind = values.dtype.kind if pd.api.types.is_numeric_dtype(values) else 'O'
+                # One float chunk makes the whole column float, as in a single read_csv
+                kinds[name] = 'f' if 'f' in (kind, kinds.get(name)) else kinds.get(name, kind)
+            typed = _downcast(chunk)
+            if writer is None:
+                schema = pa.Schema.from_pandas(typed, preserve_index=False)
+                writer = pq.ParquetWriter(tmp_path, schema)
+            # Flags with NaNs in a later chunk stay float; cast to the first chunk's schema
+            writer.write_table(pa.Table.from_pandas(typed, preserve_index=False).cast(writer.schema))
+        if writer is None:
+            raise ValueError(f"{source} has no rows")
+        metadata = {
+            'source': os.path.abspath(source),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': _sha256(source),
+            'dtypes': {name: {'i': 'int64', 'f': 'float64', 'O': 'str'}.get(kind, 'float64')
+                       for name, kind in kinds.items()},
+        }
+        writer.add_key_value_metadata({METADATA_KEY.decode(): json.dumps(metadata)})
+        writer.close()
+        writer = None
+        os.replace(tmp_path, path)
+    finally:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
+
+
+def cache_metadata(path):
+    import pyarrow.parquet as pq
+
+    metadata = pq.read_metadata(path).metadata or {}
+    return json.loads(metadata[METADATA_KEY]) if METADATA_KEY in metadata else None
+
+
+def is_fresh(source, path):
+    """Whether the cache at path was built from the current contents of source."""
+    if not os.path.exists(path):
+        return False
+    metadata = cache_metadata(path)
+    if metadata is None:
+        return False
+    stat = os.stat(source)
+    if (stat.st_size, stat.st_mtime_ns) == (metadata['size'], metadata['mtime_ns']):
+        return True
+    # Touched or copied but possibly unchanged: only the content hash decides
+    return stat.st_size == metadata['size'] and _sha256(source) == metadata['sha256']
+
+
+def ensure_cache(source=DATASET_PATH, cache_dir=CACHE_DIR):
+    """Path of an up-to-date cache for source, building it if needed."""
+    path = cache_path(source, cache_dir)
+    if not is_fresh(source, path):
+        build_cache(source, cache_dir)
+    return path
+
+
+def holdout_mask(row_ids, test_size=HOLDOUT_SIZE, seed=HOLDOUT_SEED):
+    """Test-set membership of global row numbers, independent of the chunk size."""
+    hashed = (row_ids.astype(np.uint64) + np.uint64(seed)) * np.uint64(0x9E3779B97F4A7C15)
+    return (hashed >> np.uint64(11)).astype(np.float64) / 2.0 ** 53 < test_size
+
+
+def _pyarrow_available():
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def load_dataset(source=DATASET_PATH, cache_dir=CACHE_DIR, columns=None, exact=False):
+    """The dataset read from the cache, with compact dtypes.
+
+    exact=True converts back to the frame read_csv would return (see
+    source_dtypes). Without pyarrow the CSV is parsed directly.
+    """
+    if not _pyarrow_available():
+        frame = pd.read_csv(source, usecols=columns)
+        return frame if exact else _downcast(frame)
+    path = ensure_cache(source, cache_dir)
+    frame = pd.read_parquet(path, columns=columns, memory_map=True)
+    return source_dtypes(frame, cache_metadata(path)['dtypes']) if exact else frame
+
+
+def iter_dataset(source=DATASET_PATH, chunksize=BUILD_CHUNKSIZE, cache_dir=CACHE_DIR, columns=None):
+    """The dataset in frames of at most chunksize rows, with the CSV's dtypes."""
+    if not _pyarrow_available():
+        yield from pd.read_csv(source, chunksize=chunksize, usecols=columns)
+        return
+    import pyarrow.parquet as pq
+
+    path = ensure_cache(source, cache_dir)
+    dtypes = cache_metadata(path)['dtypes']
+    offset = 0
+    for batch in pq.ParquetFile(path, memory_map=True).iter_batches(batch_size=chunksize, columns=columns):
+        frame = batch.to_pandas()
+        frame.index = pd.RangeIndex(offset, offset + len(frame))
+        offset += len(frame)
+        yield source_dtypes(frame, dtypes)
+
+
+def _widen(values):
+    # float32 -> float64 at the shortest decimal that maps back to each value,
+    # so 7.1 comes back as the double nearest 7.1 (what read_csv produces)
+    wide = values.astype(np.float64)
+    out = wide.copy()
+    done = np.isnan(values)
+    for decimals in range(8):
+        rounded = np.round(wide, decimals)
+        hit = ~done & (rounded.astype(np.float32) == values)
+        out[hit] = rounded[hit]
+        done |= hit
+        if done.all():
+            break
+    return out
+
+
+def source_dtypes(frame, dtypes):
+    """Copy of a cached frame converted back to the source's read_csv dtypes.
+
+    Values come back exactly as read_csv parses them. Use this where exact
+    values matter (training, threshold rules); the compact frame is enough
+    for the model alone.
+    """
+    out = {}
+    for name, values in frame.items():
+        dtype = dtypes.get(name, 'float64')
+        if dtype == 'str':
+            out[name] = values.astype('str')
+        elif values.dtype == np.float32:
+            widened = _widen(values.to_numpy())
+            out[name] = widened.astype(dtype) if dtype == 'int64' else widened
+        else:
+            out[name] = values.astype(dtype)
+    return pd.DataFrame(out, index=frame.index)
+
+
+def validate(frame, ranges=VALID_RANGES):
+    """Per-column counts of missing and out-of-range values, plus the mask of affected rows.
+
+    Every input field is checked for NaNs; fields with a range (feature_stats
+    and the binary flags) are also checked against it.
+    """
+    fields = [field for field in INPUT_FIELDS if field in frame]
+    values = frame[fields].to_numpy(dtype=np.float64, na_value=np.nan)
+    low = np.array([ranges.get(field, (-np.inf, np.inf))[0] for field in fields], dtype=np.float64)
+    high = np.array([ranges.get(field, (-np.inf, np.inf))[1] for field in fields], dtype=np.float64)
+    missing = np.isnan(values)
+    with np.errstate(invalid='ignore'):
+        below = values < low
+        above = values > high
+    report = pd.DataFrame(
+        {'missing': missing.sum(axis=0), 'below_min': below.sum(axis=0), 'above_max': above.sum(axis=0)},
+        index=fields,
+    )
+    return report, (missing | below | above).any(axis=1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build and validate the typed dataset cache.")
+    parser.add_argument('source', nargs='?', default=DATASET_PATH)
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    parser.add_argument('--rebuild', action='store_true', help="Rebuild even if the cache is fresh")
+    args = parser.parse_args(argv)
+
+    if args.rebuild or not is_fresh(args.source, cache_path(args.source, args.cache_dir)):
+        start = time.perf_counter()
+        build_cache(args.source, args.cache_dir)
+        print(f"Built cache in {time.perf_counter() - start:.3f}s", file=sys.stderr)
+
+    def best_of_3(fn):
+        times = []
+        for _ in range(3):
+            start = time.perf_counter()
+            result = fn()
+            times.append(time.perf_counter() - start)
+        return result, min(times)
+
+    parsed, csv_seconds = best_of_3(lambda: pd.read_csv(args.source))
+    frame, cache_seconds = best_of_3(lambda: load_dataset(args.source, args.cache_dir))
+    csv_bytes = parsed.memory_usage(deep=True).sum()
+    print(f"read_csv {csv_seconds * 1e3:.1f} ms, {csv_bytes / 1e6:.2f} MB; "
+          f"cache {cache_seconds * 1e3:.1f} ms, {frame.memory_usage(deep=True).sum() / 1e6:.2f} MB")
+
+    report, invalid = validate(frame)
+    print(report.to_string())
+    print(f"{int(invalid.sum())} of {len(frame)} rows have missing or out-of-range values")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+# Constant-memory drift monitoring of model inputs against the training data
+#
+# Each input field gets fixed bins, cut at the training set's deciles (or
+# between its distinct values for flags and other discrete fields). Live
+# inputs only increment per-bin counts, so memory does not grow with traffic,
+# and counts from several processes can be merged. report() compares live and
+# training bin proportions with the population stability index (PSI) and a
+# binned Kolmogorov-Smirnov distance.
+#
+# Usage:
+#   python drift.py reference                  # write drift_reference.json from the dataset
+#   python drift.py check export.csv           # report a file's drift against the reference
+import argparse
+import bisect
+import functools
+import json
+import os
+import sys
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from risk_model import INPUT_FIELDS
+
+REFERENCE_PATH = 'drift_reference.json'
+DATASET_PATH = 'Dataset - Updated.csv'
+DEFAULT_BINS = 10
+CHECK_CHUNKSIZE = 100_000
+
+# Conventional PSI bands: < 0.1 stable, 0.1-0.2 moderate shift, >= 0.2 significant
+PSI_WARN = 0.1
+PSI_ALERT = 0.2
+# No verdict before this many live values of a field
+MIN_OBSERVATIONS = 500
+# Floor for empty bins in the PSI log ratio
+EPSILON = 1e-4
+
+
+def reference_edges(values, bins=DEFAULT_BINS):
+    """Interior bin edges for one field of the training data."""
+    values = values[~np.isnan(values)]
+    distinct = np.unique(values)
+    if len(distinct) <= bins:
+        return (distinct[:-1] + distinct[1:]) / 2
+    return np.unique(np.quantile(values, np.linspace(0, 1, bins + 1)[1:-1]))
+
+
+def _bin_counts(values, edges):
+    present = values[~np.isnan(values)]
+    return np.bincount(np.searchsorted(edges, present, side='right'), minlength=len(edges) + 1)
+
+
+def build_reference(frame, bins=DEFAULT_BINS, source=None):
+    """Reference sketch (edges and counts per input field) of a training frame."""
+    fields = {}
+    for field in INPUT_FIELDS:
+        if field not in frame:
+            continue
+        values = frame[field].to_numpy(dtype=np.float64, na_value=np.nan)
+        edges = reference_edges(values, bins)
+        fields[field] = {
+            'edges': edges.tolist(),
+            'counts': _bin_counts(values, edges).tolist(),
+            'missing': int(np.isnan(values).sum()),
+        }
+    return {
+        'created': datetime.now(timezone.utc).isoformat(),
+        'source': source,
+        'rows': int(len(frame)),
+        'fields': fields,
+    }
+
+
+def load_reference(path=REFERENCE_PATH, dataset=DATASET_PATH):
+    """Reference from path, or built from the dataset if path does not exist."""
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    from dataset import load_dataset
+
+    return build_reference(load_dataset(dataset, exact=True), source=os.path.basename(dataset))
+
+
+def _psi(live, expected):
+    live = np.clip(live, EPSILON, None)
+    expected = np.clip(expected, EPSILON, None)
+    return float(((live - expected) * np.log(live / expected)).sum())
+
+
+class DriftMonitor:
+    """Fixed-size per-field histograms of live inputs, compared against a reference."""
+
+    def __init__(self, reference):
+        self.reference = reference
+        self.fields = list(reference['fields'])
+        self._edges = {field: np.asarray(spec['edges'], dtype=np.float64)
+                       for field, spec in reference['fields'].items()}
+        self._edge_lists = {field: edges.tolist() for field, edges in self._edges.items()}
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.rows = 0
+            self._counts = {field: np.zeros(len(edges) + 1, dtype=np.int64) for field, edges in self._edges.items()}
+            self._missing = dict.fromkeys(self.fields, 0)
+
+    def update(self, frame):
+        """Add every row of a frame of inputs."""
+        counts = {}
+        missing = {}
+        for field in self.fields:
+            if field not in frame:
+                continue
+            values = frame[field].to_numpy(dtype=np.float64, na_value=np.nan)
+            counts[field] = _bin_counts(values, self._edges[field])
+            missing[field] = int(np.isnan(values).sum())
+        self.merge({'rows': len(frame), 'counts': counts, 'missing': missing})
+
+    def update_one(self, input_data):
+        """Add one input dict."""
+        with self._lock:
+            self.rows += 1
+            for field in self.fields:
+                value = input_data.get(field)
+                if value is None or value != value:
+                    self._missing[field] += 1
+                else:
+                    self._counts[field][bisect.bisect_right(self._edge_lists[field], value)] += 1
+
+    def state(self):
+        """Counts so far, for merging into another monitor with the same reference."""
+        with self._lock:
+            return {
+                'rows': self.rows,
+                'counts': {field: counts.copy() for field, counts in self._counts.items()},
+                'missing': dict(self._missing),
+            }
+
+    def merge(self, state):
+        with self._lock:
+            self.rows += state['rows']
+            for field, counts in state['counts'].items():
+                self._counts[field] += np.asarray(counts, dtype=np.int64)
+            for field, missing in state['missing'].items():
+                self._missing[field] += missing
+
+    def report(self):
+        """Per-field PSI, binned KS distance and status, plus an overall alert flag."""
+        state = self.state()
+        fields = {}
+        for field in self.fields:
+            spec = self.reference['fields'][field]
+            expected = np.asarray(spec['counts'], dtype=np.float64)
+            counts = state['counts'][field]
+            observed = int(counts.sum())
+            entry = {
+                'observed': observed,
+                'missing_rate': state['missing'][field] / state['rows'] if state['rows'] else None,
+                'reference_missing_rate': spec['missing'] / self.reference['rows'],
+                'psi': None,
+                'ks': None,
+                'status': 'insufficient',
+            }
+            if observed and expected.sum():
+                live = counts / observed
+                expected = expected / expected.sum()
+                entry['psi'] = _psi(live, expected)
+                entry['ks'] = float(np.abs(np.cumsum(live) - np.cumsum(expected)).max())
+                if observed >= MIN_OBSERVATIONS:
+                    entry['status'] = (
+                        'alert' if entry['psi'] >= PSI_ALERT else 'warn' if entry['psi'] >= PSI_WARN else 'ok'
+                    )
+            fields[field] = entry
+        return {
+            'rows': state['rows'],
+            'reference': {'source': self.reference.get('source'), 'created': self.reference.get('created')},
+            'alert': any(entry['status'] == 'alert' for entry in fields.values()),
+            'drifted': [field for field, entry in fields.items() if entry['status'] == 'alert'],
+            'fields': fields,
+        }
+
+
+@functools.lru_cache(maxsize=1)
+def shared_monitor():
+    """Process-wide monitor on the default reference, created on first use."""
+    return DriftMonitor(load_reference())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build drift references and check inputs against them.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    reference = commands.add_parser('reference', help="Build the reference sketch from training data")
+    reference.add_argument('--dataset', default=DATASET_PATH)
+    reference.add_argument('--bins', type=int, default=DEFAULT_BINS)
+    reference.add_argument('--output', default=REFERENCE_PATH)
+    check = commands.add_parser('check', help="Report drift of an input CSV against the reference")
+    check.add_argument('input')
+    check.add_argument('--reference', default=REFERENCE_PATH)
+    check.add_argument('--chunksize', type=int, default=CHECK_CHUNKSIZE)
+    args = parser.parse_args(argv)
+
+    if args.command == 'reference':
+        from dataset import load_dataset
+
+        sketch = build_reference(load_dataset(args.dataset, exact=True), args.bins, os.path.basename(args.dataset))
+        with open(args.output, 'w') as f:
+            json.dump(sketch, f, indent=2)
+        print(f"Wrote {args.output} from {sketch['rows']} rows", file=sys.stderr)
+        return
+
+    monitor = DriftMonitor(load_reference(args.reference))
+    for chunk in pd.read_csv(args.input, chunksize=args.chunksize):
+        monitor.update(chunk)
+    report = monitor.report()
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if report['alert'] else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+# Per-feature explanations from the booster's native TreeSHAP contributions
+import functools
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from risk_model import artifact_cache, prepare_features
+from timing import timed
+
+BIAS = 'bias'
+
+
+def _iteration_range(model):
+    try:
+        return (0, model.best_iteration + 1)
+    except AttributeError:
+        return (0, 0)
+
+
+def _contributions(model, columns, matrix):
+    """Exact SHAP contributions for every row and class in one pass.
+
+    Returns an array of shape (n_rows, n_classes, n_features + 1); the last
+    column is the bias term and each row sums to the class margin.
+    """
+    dmatrix = xgb.DMatrix(matrix, feature_names=list(columns))
+    contribs = model.get_booster().predict(
+        dmatrix, pred_contribs=True, iteration_range=_iteration_range(model)
+    )
+    if contribs.ndim == 2:
+        # Binary objectives explain the positive class only
+        contribs = np.stack([-contribs, contribs], axis=1)
+    return contribs
+
+
+def explain_frame(model, columns, input_df, class_index=None):
+    """Contributions towards class_index (default: each row's predicted class).
+
+    Identical input vectors are explained once and shared. Returns a
+    DataFrame with one column per model feature plus 'bias', in margin
+    (log-odds) units, aligned with input_df.index.
+    """
+    matrix = prepare_features(input_df, columns).to_numpy(dtype=np.float32)
+    if len(matrix) == 0:
+        return pd.DataFrame(columns=list(columns) + [BIAS], index=input_df.index, dtype=float)
+    unique_rows, inverse = np.unique(matrix, axis=0, return_inverse=True)
+    contribs = _contributions(model, columns, unique_rows)
+    if class_index is None:
+        # Margins are the contribution sums, so their argmax is the predicted class
+        classes = np.argmax(contribs.sum(axis=2), axis=1)
+    else:
+        classes = np.full(len(unique_rows), class_index)
+    chosen = contribs[np.arange(len(unique_rows)), classes]
+    return pd.DataFrame(chosen[inverse.ravel()], columns=list(columns) + [BIAS], index=input_df.index)
+
+
+def top_drivers(contributions, k=3):
+    """The k features with the largest absolute contribution, as (name, value) pairs."""
+    values = contributions.drop(BIAS)
+    order = values.abs().sort_values(ascending=False, kind='stable').index[:k]
+    return [(name, float(values[name])) for name in order]
+
+
+def format_drivers(drivers):
+    return ', '.join(f"{name} ({value:+.2f})" for name, value in drivers)
+
+
+def top_drivers_frame(contributions, k=3):
+    """format_drivers(top_drivers(row)) for every row, without per-row pandas work."""
+    values = contributions.drop(columns=BIAS)
+    names = np.asarray(values.columns)
+    matrix = values.to_numpy()
+    # Stable sort keeps column order for ties, like top_drivers
+    order = np.argsort(-np.abs(matrix), axis=1, kind='stable')[:, :k]
+    picked = np.take_along_axis(matrix, order, axis=1)
+    texts = [
+        format_drivers(zip(names[row_order], row_values))
+        for row_order, row_values in zip(order, picked)
+    ]
+    return pd.Series(texts, index=contributions.index, dtype=object)
+
+
+@functools.lru_cache(maxsize=1024)
+def _explain_vector(model_sha, fields, values):
+    model, columns = artifact_cache.get()
+    frame = pd.DataFrame([dict(zip(fields, values))])
+    return explain_frame(model, columns, frame).iloc[0]
+
+
+@timed('explain')
+def explain_one(input_data):
+    """Cached explanation of one input dict with the current model."""
+    artifact_cache.get()
+    fields = tuple(input_data)
+    values = tuple(float(input_data[field]) for field in fields)
+    return _explain_vector(artifact_cache.stats()['model_sha256'], fields, values)
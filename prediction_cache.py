@@ -0,0 +1,193 @@
+# Bounded LRU cache of predictions and recommendations keyed by quantized vitals
+import collections
+import threading
+
+import numpy as np
+import pandas as pd
+
+from recommendations import thresholds, generate_recommendations, generate_recommendations_frame
+from risk_model import INPUT_FIELDS, artifact_cache, prepare_features
+from timing import stage
+
+DEFAULT_MAXSIZE = 4096
+
+# Decimal places each input is recorded at (the app's number_input steps)
+FEATURE_DECIMALS = {
+    'Age': 0,
+    'SystolicBP': 0,
+    'DiastolicBP': 0,
+    'BS': 1,
+    'BodyTemp': 1,
+    'HeartRate': 0,
+    'BMI': 1,
+    'Previous Complications': 0,
+    'Preexisting Diabetes': 0,
+    'Gestational Diabetes': 0,
+    'Mental Health': 0,
+}
+
+_DECIMALS = np.array([FEATURE_DECIMALS[field] for field in INPUT_FIELDS])
+_SCALE = 10.0 ** _DECIMALS
+
+
+def quantize(frame):
+    """Integer keys for every row plus a mask of rows that are safe to cache.
+
+    A row is cacheable only if every value already sits exactly on its
+    grid (e.g. 7.1, not 7.13) and none is NaN. Two cacheable rows with the
+    same key then hold bit-identical inputs, so sharing a result is exact.
+    """
+    values = frame[INPUT_FIELDS].to_numpy(dtype='float64', na_value=np.nan)
+    with np.errstate(invalid='ignore'):
+        rounded = np.round(values * _SCALE) / _SCALE
+        cacheable = (rounded == values).all(axis=1)
+    keys = np.where(cacheable[:, None], np.rint(np.nan_to_num(values) * _SCALE), 0).astype(np.int64)
+    return keys, cacheable
+
+
+def quantize_one(input_data):
+    """Key for one input dict, or None if it cannot be cached (see quantize)."""
+    key = []
+    for field, scale in zip(INPUT_FIELDS, _SCALE.tolist()):
+        value = input_data.get(field)
+        if value is None or value != value:
+            return None
+        scaled = round(value * scale)
+        if scaled / scale != value:
+            return None
+        key.append(scaled)
+    return tuple(key)
+
+
+class PredictionCache:
+    """LRU cache of (class probabilities, recommendations) per input vector.
+
+    Entries are dropped when the model artifact changes, since the cache
+    checks the model object returned by artifacts.get() on each call.
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, artifacts=artifact_cache):
+        self.maxsize = maxsize
+        self.artifacts = artifacts
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._model = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _current_model(self):
+        model, columns = self.artifacts.get()
+        with self._lock:
+            if model is not self._model:
+                if self._model is not None:
+                    self.invalidations += 1
+                self._entries.clear()
+                self._model = model
+        return model, columns
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def _store(self, key, entry):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def score_one(self, input_data):
+        """(risk code, class probabilities, recommendations) for one input dict."""
+        self._current_model()
+        key = quantize_one(input_data)
+        entry = self._lookup(key) if key is not None else None
+        if entry is None:
+            if key is None:
+                with self._lock:
+                    self.misses += 1
+            proba = self.artifacts.predictor().predict_proba_one(input_data)
+            entry = (proba, generate_recommendations(input_data, thresholds))
+            if key is not None:
+                self._store(key, entry)
+        proba, recommendations = entry
+        return int(np.argmax(proba)), proba, recommendations
+
+    def score_frame(self, frame):
+        """Vectorized scoring with the cache in front.
+
+        Returns (codes, probabilities, recommendations Series). Repeated
+        input vectors are looked up and predicted once; rows missing from
+        the cache are predicted together in one call. Rows served without
+        a prediction count as hits, predicted vectors as misses.
+        """
+        model, columns = self._current_model()
+        if not len(frame):
+            return np.empty(0, dtype=np.int64), np.empty((0, 0)), pd.Series([], index=frame.index, dtype=object)
+        keys, cacheable = quantize(frame)
+
+        # One slot per distinct cacheable key, plus one per uncacheable row
+        cacheable_rows = np.flatnonzero(cacheable)
+        other_rows = np.flatnonzero(~cacheable)
+        unique, first, inverse = np.unique(keys[cacheable_rows], axis=0, return_index=True, return_inverse=True)
+        slot = np.empty(len(frame), dtype=np.int64)
+        slot[cacheable_rows] = inverse.reshape(-1)
+        slot[other_rows] = len(unique) + np.arange(len(other_rows))
+        slot_rows = np.concatenate([cacheable_rows[first], other_rows])
+        slot_keys = [tuple(key) for key in unique.tolist()] + [None] * len(other_rows)
+
+        with self._lock:
+            cached = self._entries
+            entries = [cached.get(key) if key is not None else None for key in slot_keys]
+            for key, entry in zip(slot_keys, entries):
+                if entry is not None:
+                    cached.move_to_end(key)
+            missing = [i for i, entry in enumerate(entries) if entry is None]
+            self.hits += len(frame) - len(missing)
+            self.misses += len(missing)
+        if missing:
+            subset = frame.iloc[slot_rows[missing]]
+            features = prepare_features(subset[INPUT_FIELDS], columns)
+            with stage('predict'):
+                proba = model.predict_proba(features)
+            recommendations = generate_recommendations_frame(subset, thresholds).tolist()
+            for j, i in enumerate(missing):
+                entry = (proba[j], recommendations[j])
+                entries[i] = entry
+                if slot_keys[i] is not None:
+                    self._store(slot_keys[i], entry)
+
+        proba = np.vstack([entry[0] for entry in entries])[slot]
+        recommendations = np.array([entry[1] for entry in entries], dtype=object)[slot]
+        return np.argmax(proba, axis=1), proba, pd.Series(recommendations, index=frame.index, dtype=object)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'hit_rate': self.hits / lookups if lookups else None,
+            }
+
+
+# Shared by the app and any in-process scoring
+prediction_cache = PredictionCache()
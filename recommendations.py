@@ -0,0 +1,457 @@
+# Guideline thresholds and recommendation rules shared by the app and batch tools
+import bisect
+import functools
+
+import numpy as np
+import pandas as pd
+
+from timing import timed
+
+
+# Define thresholds based on guideline cut-offs (BodyTemp in °F, BS in mmol/L)
+thresholds = {
+    'Age': {
+        'high': 35,
+        'low': 20
+    },
+    'SystolicBP': {
+        'high': 140,
+        'very_high': 160,
+        'elevated': 130,
+        'low': 90,
+        'very_low': 70
+    },
+    'DiastolicBP': {
+        'high': 90,
+        'very_high': 100,
+        'elevated': 80,
+        'low': 60,
+        'very_low': 49
+    },
+    'BS': {
+        'high': 12.0,
+        'very_high': 15.0,
+        'low': 6.0,
+        'very_low': 4.0
+    },
+    'BodyTemp': {
+        'high': 100.0,
+        'very_high': 100.4,
+        'low': 97.0,
+        'very_low': 95.0
+    },
+    'HeartRate': {
+        'high': 82,
+        'very_high': 100,
+        'low': 66,
+        'very_low': 60
+    },
+    'BMI': {
+        'high': 30,
+        'very_high': 35,
+        'low': 18.5,
+        'very_low': 16
+    },
+    'Previous Complications': {
+        'high': 1,
+        'low': 0
+    },
+    'Preexisting Diabetes': {
+        'high': 1,
+        'low': 0
+    },
+    'Gestational Diabetes': {
+        'high': 1,
+        'low': 0
+    },
+    'Mental Health': {
+        'high': 1,
+        'low': 0
+    }
+}
+
+
+# Recommendation texts keyed by rule code, in the order they are reported
+RECOMMENDATION_TEXT = {
+    'advanced_maternal_age': (
+        "Advanced maternal age (≥35 years): consider additional fetal aneuploidy screening and non-invasive prenatal testing per ACOG guidelines"
+    ),  # ([pubmed.ncbi.nlm.nih.gov](https://pubmed.ncbi.nlm.nih.gov/35852294/?utm_source=chatgpt.com))
+    'adolescent_pregnancy': (
+        "Adolescent pregnancy: ensure comprehensive adolescent-friendly care and counseling per WHO recommendations"
+    ),  # ([who.int](https://www.who.int/news/item/23-04-2025-who-releases-new-guideline-to-prevent-adolescent-pregnancies-and-improve-girls--health?utm_source=chatgpt.com))
+    'hypertension_stage2': (
+        "Hypertension in pregnancy (Stage 2): initiate antihypertensive therapy and consider low-dose aspirin prophylaxis (81 mg/day) after 12 weeks gestation per ACOG"
+    ),  # ([acog.org](https://www.acog.org/topics/hypertension-and-preeclampsia-in-pregnancy?utm_source=chatgpt.com), [journals.lww.com](https://journals.lww.com/greenjournal/fulltext/2018/07000/acog_committee_opinion_no__743_summary__low_dose.52.aspx?utm_source=chatgpt.com))
+    'hypertension_stage1': (
+        "Stage 1 hypertension: monitor BP biweekly and encourage dietary sodium restriction per ACOG guidance"
+    ),  # ([acog.org](https://www.acog.org/topics/hypertension-and-preeclampsia-in-pregnancy?utm_source=chatgpt.com))
+    'hypotension': (
+        "Hypotension (<90/60 mmHg): assess for volume status and advise increased fluid intake per clinical best practices"
+    ),
+    'hyperglycemia': (
+        "Elevated blood glucose: refer for oral glucose tolerance test (OGTT) and begin medical nutrition therapy per ADA standards"
+    ),  # ([diabetes.org](https://diabetes.org/living-with-diabetes/pregnancy/gestational-diabetes?utm_source=chatgpt.com), [diabetesjournals.org](https://diabetesjournals.org/care/article/47/Supplement_1/S282/153948/15-Management-of-Diabetes-in-Pregnancy-Standards?utm_source=chatgpt.com))
+    'hypoglycemia': (
+        "Hypoglycemia (<70 mg/dL): evaluate for symptoms and consider dietary modification per ADA hypoglycemia guidelines"
+    ),
+    'preexisting_diabetes': (
+        "Preexisting diabetes: optimize glycemic control (HbA1c <6.5%) and coordinate care with endocrinology per ADA pregnancy standards"
+    ),  # ([diabetesjournals.org](https://diabetesjournals.org/care/article/47/Supplement_1/S282/153948/15-Management-of-Diabetes-in-Pregnancy-Standards?utm_source=chatgpt.com))
+    'gestational_diabetes': (
+        "Gestational diabetes: implement diet and exercise plan, self-monitoring of blood glucose, and consider insulin therapy as needed"
+    ),  # ([diabetes.org](https://diabetes.org/living-with-diabetes/pregnancy/gestational-diabetes?utm_source=chatgpt.com))
+    'fever': (
+        "Fever (≥38°C): seek evaluation for infection and initiate antipyretic therapy"
+    ),
+    'hypothermia': (
+        "Hypothermia (<35°C): urgent medical evaluation and warming measures per hypothermia management protocols"
+    ),  # ([ncbi.nlm.nih.gov](https://www.ncbi.nlm.nih.gov/books/NBK545239/?utm_source=chatgpt.com), [my.clevelandclinic.org](https://my.clevelandclinic.org/health/diseases/21164-hypothermia-low-body-temperature?utm_source=chatgpt.com))
+    'tachycardia': (
+        "Sinus tachycardia (>100 bpm): evaluate for infection, anemia, and hyperthyroidism; consider ECG per ACOG"
+    ),  # ([pmc.ncbi.nlm.nih.gov](https://pmc.ncbi.nlm.nih.gov/articles/PMC8439506/?utm_source=chatgpt.com))
+    'bradycardia': (
+        "Bradycardia (<60 bpm): assess for symptomatic bradycardia and refer for cardiology evaluation"
+    ),
+    'obesity': (
+        "Obesity (BMI ≥30): refer to nutritionist for weight management plan and monitor gestational weight gain"
+    ),  # ([who.int](https://www.who.int/europe/news-room/fact-sheets/item/a-healthy-lifestyle---who-recommendations?utm_source=chatgpt.com))
+    'underweight': (
+        "Underweight (BMI <18.5): advise increased caloric intake and micronutrient supplementation"
+    ),
+    'previous_complications': (
+        "History of pregnancy complications: increase frequency of prenatal visits and targeted fetal surveillance"
+    ),
+    'mental_health': (
+        "Perinatal mental health concern: perform depression/anxiety screening (e.g., EPDS) and consider referral to mental health services"
+    ),  # ([acog.org](https://www.acog.org/programs/perinatal-mental-health/implementing-perinatal-mental-health-screening?utm_source=chatgpt.com))
+    'prenatal_reminder': (
+        "Ensure ongoing prenatal monitoring and education at each visit"
+    ),
+    'all_normal': (
+        "All parameters within normal limits: continue standard prenatal care"
+    ),
+}
+
+# Guideline rules followed by the universal prenatal reminder
+RULE_CODES = list(RECOMMENDATION_TEXT)[:-2]
+# Rules whose text triggers the universal prenatal care reminder
+REMINDER_TRIGGERS = frozenset(
+    code for code in RULE_CODES
+    if 'pregnancy' in RECOMMENDATION_TEXT[code].lower() or 'glucose' in RECOMMENDATION_TEXT[code].lower()
+)
+
+
+# Declarative band table behind both the recommendations and the "Detailed
+# Parameter Analysis" panel. Each parameter lists the bands outside its
+# normal range as (comparison, panel level, panel message, recommendation);
+# the cut-off for a band is thresholds[field][band]. Bands below normal use
+# '<' or '<=', bands above use '>=' or '>'. Blood pressure is classified per
+# component and reported as the first band in BP_PRIORITY either one is in.
+VITAL_BANDS = {
+    'Age': {
+        'title': "Age Analysis",
+        'fields': ['Age'],
+        'normal': "Maternal age ({value} years) within typical range — continue routine antenatal surveillance.",
+        'bands': {
+            'low': ('<', 'warning', "Adolescent pregnancy (<{cut} years) — per WHO, ensure adolescent-friendly antenatal care and psychosocial support.", 'adolescent_pregnancy'),
+            'high': ('>=', 'warning', "Advanced maternal age (≥{cut} years) — per ACOG, consider offering aneuploidy screening and detailed ultrasound.", 'advanced_maternal_age'),
+        },
+    },
+    'BloodPressure': {
+        'title': "Blood Pressure Analysis",
+        'fields': ['SystolicBP', 'DiastolicBP'],
+        'normal': "Blood pressure ({value}/{value2} mm Hg) is within normal limits.",
+        'bands': {
+            'very_low': ('<=', 'error', "Hypotension (≤{cut}/{cut2} mm Hg) — assess volume status and consider increased oral fluids.", 'hypotension'),
+            'low': ('<', 'warning', "Low blood pressure ({value}/{value2} mm Hg) — ensure adequate hydration and evaluate for orthostatic symptoms.", 'hypotension'),
+            'elevated': ('>=', 'warning', "Stage 1 hypertension ({value}/{value2} mm Hg) — monitor biweekly and advise dietary sodium restriction.", 'hypertension_stage1'),
+            'high': ('>=', 'warning', "Stage 2 hypertension (≥{cut}/{cut2} mm Hg) — initiate antihypertensives and consider low-dose aspirin prophylaxis.", 'hypertension_stage2'),
+            'very_high': ('>=', 'error', "Severe hypertension (≥{cut}/{cut2} mm Hg) — initiate or adjust antihypertensives and evaluate for preeclampsia.", 'hypertension_stage2'),
+        },
+    },
+    'BS': {
+        'title': "Blood Glucose Analysis",
+        'fields': ['BS'],
+        'normal': "Blood glucose ({value} mmol/L) within target range.",
+        'bands': {
+            'very_low': ('<=', 'error', "Hypoglycemia (≤{cut} mmol/L) — assess for symptoms, advise carbohydrate intake.", 'hypoglycemia'),
+            'high': ('>=', 'warning', "Elevated blood glucose ({value} mmol/L) — reinforce diet/exercise plan and self-monitoring.", None),
+            'very_high': ('>=', 'error', "Marked hyperglycemia (≥{cut} mmol/L) — per ADA, refer for OGTT and initiate medical nutrition therapy.", 'hyperglycemia'),
+        },
+    },
+    'BodyTemp': {
+        'title': "Body Temperature Analysis",
+        'fields': ['BodyTemp'],
+        'normal': "Temperature ({value}°F) is normal.",
+        'bands': {
+            'very_low': ('<', 'error', "Hypothermia (<{cut}°F / 35°C) — urgent evaluation and warming measures.", 'hypothermia'),
+            'high': ('>=', 'warning', "Low-grade fever ({value}°F) — monitor temperature and hydration.", None),
+            'very_high': ('>=', 'error', "Fever (≥{cut}°F / 38°C) — evaluate for infection, initiate antipyretics.", 'fever'),
+        },
+    },
+    'HeartRate': {
+        'title': "Cardiac Rate Analysis",
+        'fields': ['HeartRate'],
+        'normal': "Heart rate ({value} bpm) within normal physiologic range.",
+        'bands': {
+            'very_low': ('<', 'error', "Bradycardia (< {cut} bpm) — assess for symptoms and cardiology referral.", 'bradycardia'),
+            'high': ('>=', 'warning', "Mild tachycardia ({value} bpm) — monitor and review stimulant intake.", None),
+            'very_high': ('>', 'error', "Tachycardia (> {cut} bpm) — rule out anemia, infection, thyroid dysfunction, and consider ECG.", 'tachycardia'),
+        },
+    },
+    'BMI': {
+        'title': "BMI Analysis",
+        'fields': ['BMI'],
+        'normal': "BMI ({value}) is within normal range.",
+        'bands': {
+            'very_low': ('<=', 'error', "Severe underweight (BMI ≤ {cut}) — evaluate nutritional status and supplement calories.", 'underweight'),
+            'low': ('<', 'warning', "Underweight (BMI < {cut}) — encourage increased caloric and protein intake.", 'underweight'),
+            'high': ('>=', 'warning', "Obesity (BMI ≥ {cut}) — recommend diet/exercise plan and watch weight gain.", 'obesity'),
+            'very_high': ('>=', 'error', "Severe obesity (BMI ≥ {cut}) — refer to nutritionist and monitor gestational weight gain.", 'obesity'),
+        },
+    },
+    'Previous Complications': {
+        'title': "Obstetric History Analysis",
+        'fields': ['Previous Complications'],
+        'normal': "No prior complications — standard prenatal visit schedule.",
+        'bands': {
+            'high': ('>=', 'warning', "History of pregnancy complications — increase antenatal visit frequency and targeted fetal surveillance.", 'previous_complications'),
+        },
+    },
+    'Preexisting Diabetes': {
+        'title': "Preexisting Diabetes Analysis",
+        'fields': ['Preexisting Diabetes'],
+        'normal': "No preexisting diabetes — continue routine glucose monitoring.",
+        'bands': {
+            'high': ('>=', 'warning', "Preexisting diabetes — optimize glycemic control (HbA1c <6.5%) and coordinate endocrinology care.", 'preexisting_diabetes'),
+        },
+    },
+    'Gestational Diabetes': {
+        'title': "Gestational Diabetes Analysis",
+        'fields': ['Gestational Diabetes'],
+        'normal': "No gestational diabetes — follow standard screening schedule at 24–28 weeks.",
+        'bands': {
+            'high': ('>=', 'warning', "Gestational diabetes — implement diet/exercise, self-monitoring of BG, consider insulin if needed.", 'gestational_diabetes'),
+        },
+    },
+    'Mental Health': {
+        'title': "Perinatal Mental Health Analysis",
+        'fields': ['Mental Health'],
+        'normal': "No mental health concerns — continue routine psychosocial support.",
+        'bands': {
+            'high': ('>=', 'warning', "Reported mental health concerns — conduct EPDS screening and refer to perinatal mental health services.", 'mental_health'),
+        },
+    },
+}
+
+# Band order from lowest to highest value
+BAND_ORDER = ['very_low', 'low', 'normal', 'elevated', 'high', 'very_high']
+# Which component band wins when blood pressure components disagree
+BP_PRIORITY = ['very_high', 'high', 'elevated', 'very_low', 'low', 'normal']
+
+# Classification result for missing (NaN) inputs
+UNKNOWN = -1
+
+
+class CompiledBands:
+    """Sorted breakpoints for one parameter of VITAL_BANDS.
+
+    classify() returns band indices into self.bands, or UNKNOWN where an
+    input is missing; one searchsorted per field works for any row count.
+    """
+
+    def __init__(self, name, spec, thresholds):
+        self.name = name
+        self.title = spec['title']
+        self.fields = spec['fields']
+        self.bands = [band for band in BAND_ORDER if band == 'normal' or band in spec['bands']]
+        self.breaks = [self._breakpoints(spec, thresholds[field]) for field in self.fields]
+        self.cuts = {
+            band: tuple(thresholds[field][band] for field in self.fields)
+            for band in spec['bands']
+        }
+        self.rules = {band: spec['bands'][band] for band in spec['bands']}
+        self.normal_message = spec['normal']
+        if len(self.fields) > 1:
+            # Priority rank of each band, and the band index for each rank
+            priority = [band for band in BP_PRIORITY if band in self.bands]
+            self._rank = np.array([priority.index(band) for band in self.bands])
+            self._by_rank = np.array([self.bands.index(band) for band in priority])
+
+    def _breakpoints(self, spec, cuts):
+        # Band i+1 starts at breaks[i]; '<=' and '>' move the edge one ulp up
+        breaks = []
+        for band in self.bands[:-1]:
+            upper = self.bands[self.bands.index(band) + 1]
+            edge_band = band if BAND_ORDER.index(band) < BAND_ORDER.index('normal') else upper
+            op = spec['bands'][edge_band][0]
+            cut = float(cuts[edge_band])
+            breaks.append(float(np.nextafter(cut, np.inf)) if op in ('<=', '>') else cut)
+        if breaks != sorted(breaks):
+            raise ValueError(f"Thresholds for {self.name} are not in ascending band order: {breaks}")
+        return breaks
+
+    def classify(self, columns):
+        """Band indices for arrays of values, one array per field."""
+        per_field = []
+        for values, breaks in zip(columns, self.breaks):
+            index = np.searchsorted(breaks, values, side='right')
+            per_field.append(np.where(np.isnan(values), UNKNOWN, index))
+        if len(per_field) == 1:
+            return per_field[0]
+        known = np.logical_and.reduce([index != UNKNOWN for index in per_field])
+        ranks = np.min([self._rank[np.where(index == UNKNOWN, 0, index)] for index in per_field], axis=0)
+        return np.where(known, self._by_rank[ranks], UNKNOWN)
+
+    def classify_one(self, values):
+        """Band index for one set of field values, using bisect."""
+        indices = []
+        for value, breaks in zip(values, self.breaks):
+            if value is None or pd.isna(value):
+                return UNKNOWN
+            indices.append(bisect.bisect_right(breaks, value))
+        if len(indices) == 1:
+            return indices[0]
+        return int(self._by_rank[min(self._rank[i] for i in indices)])
+
+    def band_name(self, index):
+        return None if index == UNKNOWN else self.bands[index]
+
+    def recommendation(self, index):
+        band = self.band_name(index)
+        return self.rules[band][3] if band in self.rules else None
+
+    def panel_entry(self, index, values):
+        """(level, message) for the analysis panel, or None if input is missing."""
+        band = self.band_name(index)
+        if band is None:
+            return None
+        context = {'value': values[0], 'value2': values[-1]}
+        if band == 'normal':
+            return 'success', self.normal_message.format(**context)
+        _, level, message, _ = self.rules[band]
+        cuts = self.cuts[band]
+        context.update(cut=cuts[0], cut2=cuts[-1])
+        return level, message.format(**context)
+
+
+def _thresholds_key(thresholds):
+    return tuple(sorted((field, tuple(sorted(cuts.items()))) for field, cuts in thresholds.items()))
+
+
+@functools.lru_cache(maxsize=8)
+def _compile(key):
+    table = {field: dict(cuts) for field, cuts in key}
+    return {name: CompiledBands(name, spec, table) for name, spec in VITAL_BANDS.items()}
+
+
+def compile_bands(thresholds):
+    """Compiled band index for a thresholds dict (memoized on its contents)."""
+    return _compile(_thresholds_key(thresholds))
+
+
+@timed('classify')
+def classify_one(input_data, thresholds):
+    """Band index per parameter of VITAL_BANDS for one input dict."""
+    return {
+        name: bands.classify_one([input_data[field] for field in bands.fields])
+        for name, bands in compile_bands(thresholds).items()
+    }
+
+
+def _column(frame, name):
+    return frame[name].to_numpy(dtype='float64', na_value=np.nan)
+
+
+def classify_frame(frame, thresholds):
+    """Band index arrays per parameter of VITAL_BANDS for a whole frame."""
+    return {
+        name: bands.classify([_column(frame, field) for field in bands.fields])
+        for name, bands in compile_bands(thresholds).items()
+    }
+
+
+@timed('analysis')
+def parameter_analysis(input_data, thresholds, classes=None):
+    """(title, level, message) entries for the Detailed Parameter Analysis panel."""
+    compiled = compile_bands(thresholds)
+    classes = classes if classes is not None else classify_one(input_data, thresholds)
+    entries = []
+    for name, bands in compiled.items():
+        entry = bands.panel_entry(classes[name], [input_data[field] for field in bands.fields])
+        if entry is not None:
+            entries.append((bands.title, *entry))
+    return entries
+
+
+def _join_codes(codes):
+    codes = list(codes)
+    if any(code in REMINDER_TRIGGERS for code in codes):
+        codes.append('prenatal_reminder')
+    if not codes:
+        codes.append('all_normal')
+    return '; '.join(RECOMMENDATION_TEXT[code] for code in codes)
+
+
+@timed('recommendations')
+def recommendations_from_classes(classes, thresholds):
+    """Recommendation string for one patient's classify_one result."""
+    compiled = compile_bands(thresholds)
+    fired = {compiled[name].recommendation(index) for name, index in classes.items()}
+    return _join_codes(code for code in RULE_CODES if code in fired)
+
+
+@functools.lru_cache(maxsize=1024)
+def _assess(items, key):
+    input_data = dict(items)
+    table = {field: dict(cuts) for field, cuts in key}
+    classes = classify_one(input_data, table)
+    return recommendations_from_classes(classes, table), tuple(parameter_analysis(input_data, table, classes))
+
+
+def assess(input_data, thresholds):
+    """(recommendations, analysis panel entries) for one input dict, memoized per input vector."""
+    return _assess(tuple(sorted(input_data.items())), _thresholds_key(thresholds))
+
+
+# Updated guidelines-based recommendation generator
+def generate_recommendations(input_data, thresholds):
+    return recommendations_from_classes(classify_one(input_data, thresholds), thresholds)
+
+
+def recommendation_flags(frame, thresholds):
+    """Evaluate every guideline rule over whole columns.
+
+    Returns a boolean array of shape (len(frame), len(RULE_CODES)) whose
+    columns follow RULE_CODES. NaN inputs never fire a rule.
+    """
+    compiled = compile_bands(thresholds)
+    classes = classify_frame(frame, thresholds)
+    flags = np.zeros((len(frame), len(RULE_CODES)), dtype=bool)
+    for name, index in classes.items():
+        bands = compiled[name]
+        for band_index, band in enumerate(bands.bands):
+            code = bands.recommendation(band_index)
+            if code is not None:
+                flags[:, RULE_CODES.index(code)] |= index == band_index
+    return flags
+
+
+@timed('recommendations_frame')
+def generate_recommendations_frame(frame, thresholds):
+    """DataFrame version of generate_recommendations.
+
+    Returns a Series of recommendation strings aligned with frame.index,
+    identical to applying generate_recommendations row by row.
+    """
+    flags = recommendation_flags(frame, thresholds)
+    if len(flags) == 0:
+        return pd.Series([], index=frame.index, dtype=object)
+    # Only a handful of rule combinations occur, so build each string once
+    bits = flags.astype(np.int64) @ (np.int64(1) << np.arange(len(RULE_CODES), dtype=np.int64))
+    _, first, inverse = np.unique(bits, return_index=True, return_inverse=True)
+    texts = np.array(
+        [_join_codes(code for code, fired in zip(RULE_CODES, flags[i]) if fired) for i in first],
+        dtype=object,
+    )
+    return pd.Series(texts[inverse], index=frame.index, dtype=object)
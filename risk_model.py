@@ -0,0 +1,296 @@
+# Model loading and feature preparation shared by the app and batch tools
+import hashlib
+import json
+import os
+import threading
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from artifact import MANIFEST_FILE, is_artifact, load_artifact
+from timing import stage, timed
+
+# RISK_MODEL_PATH may point at a pickle or at an artifact directory (see artifact.py)
+MODEL_PATH = os.environ.get('RISK_MODEL_PATH', 'risk_level_xgb_model.pkl')
+COLUMNS_PATH = 'columns.json'
+
+# Define the risk map
+risk_map = {0: 'Low Risk', 1: 'High Risk'}
+
+
+def risk_label(code, model=None):
+    """Display label for a predicted class code.
+
+    Artifacts carry their own label map; pickled models use risk_map. A
+    class neither names (the shipped model predicts three) gets a generic
+    label instead of failing.
+    """
+    labels = getattr(model, 'label_map', None) or risk_map
+    return labels.get(int(code), f"Risk class {int(code)}")
+
+
+# Define feature statistics
+feature_stats = {
+    "Age": {"mean": 29.87, "std": 13.47, "min": 10, "max": 70},
+    "SystolicBP": {"mean": 113.19, "std": 18.40, "min": 70, "max": 160},
+    "DiastolicBP": {"mean": 76.46, "std": 13.86, "min": 49, "max": 100},
+    "BS": {"mean": 8.72, "std": 3.29, "min": 6.0, "max": 19.0},
+    "BodyTemp": {"mean": 98.66, "std": 1.37, "min": 98.0, "max": 103.0},
+    "HeartRate": {"mean": 74.30, "std": 8.08, "min": 60, "max": 90},
+}
+
+# Fields collected for every patient (same keys as the app's user_input dict)
+INPUT_FIELDS = [
+    'Age',
+    'SystolicBP',
+    'DiastolicBP',
+    'BS',
+    'BodyTemp',
+    'HeartRate',
+    'BMI',
+    'Previous Complications',
+    'Preexisting Diabetes',
+    'Gestational Diabetes',
+    'Mental Health',
+]
+
+
+@timed('model_load')
+def load_model(path=MODEL_PATH):
+    if is_artifact(path):
+        return load_artifact(path)
+    return joblib.load(path)
+
+
+@timed('columns_read')
+def load_columns(path=COLUMNS_PATH):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+@timed('prepare_features')
+def prepare_features(input_df, columns):
+    """Apply the training-time preprocessing to a frame of any length."""
+    features = pd.get_dummies(input_df)
+    # Columns unseen in the input are zero-filled, extra columns are dropped
+    return features.reindex(columns=columns, fill_value=0)
+
+
+def predict_frame(model, input_df, columns):
+    """Predict risk codes for every row of input_df in one call."""
+    features = prepare_features(input_df, columns)
+    with stage('predict'):
+        return model.predict(features)
+
+
+class FastPredictor:
+    """Single-row inference without building a DataFrame.
+
+    The input dict is written straight into a preallocated float32 row
+    using a column-index map computed once from the booster's feature
+    names, and the booster is called on that array directly. Outputs are
+    identical to predict_frame on the same input (see verify_fast_path).
+    """
+
+    def __init__(self, model, columns):
+        self.model = model
+        self.booster = model.get_booster()
+        names = self.booster.feature_names or list(columns)
+        if list(names) != list(columns):
+            raise ValueError(f"Model features {names} do not match column list {columns}")
+        self.columns = list(names)
+        self._slots = tuple(enumerate(self.columns))
+        self._row = np.zeros((1, len(self.columns)), dtype=np.float32)
+        self._lock = threading.Lock()
+        try:
+            best = model.best_iteration
+            self._iteration_range = (0, best + 1)
+        except AttributeError:
+            self._iteration_range = (0, 0)
+
+    @timed('predict_one')
+    def predict_proba_one(self, input_data):
+        """Class probabilities for one input dict, shape (n_classes,)."""
+        with self._lock:
+            row = self._row[0]
+            for i, name in self._slots:
+                # Columns absent from the input are zero-filled like prepare_features
+                value = input_data.get(name, 0)
+                row[i] = np.nan if value is None else value
+            out = self.booster.inplace_predict(
+                self._row, iteration_range=self._iteration_range, validate_features=False
+            )
+        out = np.asarray(out, dtype=np.float64).reshape(-1)
+        if out.size == 1:
+            # Binary objectives return P(class 1) only
+            return np.array([1.0 - out[0], out[0]])
+        return out
+
+    def predict_one(self, input_data):
+        """Predicted risk code for one input dict."""
+        return int(np.argmax(self.predict_proba_one(input_data)))
+
+    def feature_row(self, input_data):
+        """float32 feature vector for one input dict, in model column order."""
+        row = np.zeros(len(self.columns), dtype=np.float32)
+        for i, name in self._slots:
+            value = input_data.get(name, 0)
+            row[i] = np.nan if value is None else value
+        return row
+
+    @timed('predict_matrix')
+    def predict_proba_matrix(self, matrix):
+        """Class probabilities for a float32 matrix in model column order, shape (n, n_classes)."""
+        out = self.booster.inplace_predict(matrix, iteration_range=self._iteration_range, validate_features=False)
+        out = np.asarray(out, dtype=np.float64)
+        if out.ndim == 1:
+            return np.column_stack([1.0 - out, out])
+        return out
+
+
+class ArtifactCache:
+    """Process-wide cache of the model and its column list.
+
+    Streamlit re-executes the app script on every rerun but keeps imported
+    modules, so one instance here is shared by all sessions. Each get()
+    costs an os.stat per watched file; the artifacts are reloaded only when
+    a file's mtime/size changes and its SHA-256 differs from the loaded copy.
+
+    If model_path is an artifact directory, its columns come from the
+    embedded schema (columns_path is ignored) and a schema needing a field
+    INPUT_FIELDS lacks raises SchemaMismatchError instead of zero-filling.
+    Inputs the model ignores are warned about (see RiskArtifact.check_fields)
+    and listed in stats().
+    """
+
+    def __init__(self, model_path=MODEL_PATH, columns_path=COLUMNS_PATH):
+        self.model_path = model_path
+        self.columns_path = columns_path
+        self._lock = threading.Lock()
+        self._model = None
+        self._columns = None
+        self._stamps = None
+        self._hashes = None
+        self._predictor = None
+        self.hits = 0
+        self.loads = 0
+        self.last_load_seconds = None
+        self.ignored_inputs = None
+
+    def _watched(self):
+        if is_artifact(self.model_path):
+            # The manifest records the model hash, so it changes with the model
+            return (os.path.join(self.model_path, MANIFEST_FILE),)
+        return (self.model_path, self.columns_path)
+
+    def _stamp(self):
+        stamps = []
+        for path in self._watched():
+            info = os.stat(path)
+            stamps.append((info.st_mtime_ns, info.st_size))
+        return tuple(stamps)
+
+    def _load(self):
+        if is_artifact(self.model_path):
+            model = load_artifact(self.model_path)
+            self.ignored_inputs = model.check_fields(INPUT_FIELDS)
+            return model, list(model.features)
+        columns = load_columns(self.columns_path)
+        self.ignored_inputs = [field for field in INPUT_FIELDS if field not in columns]
+        return load_model(self.model_path), columns
+
+    def get(self):
+        """Return (model, columns), reloading if either file changed."""
+        with self._lock:
+            stamps = self._stamp()
+            if self._model is not None and stamps == self._stamps:
+                self.hits += 1
+                return self._model, self._columns
+
+            hashes = tuple(_file_sha256(path) for path in self._watched())
+            if self._model is not None and hashes == self._hashes:
+                # Touched but unchanged: keep the loaded copy
+                self._stamps = stamps
+                self.hits += 1
+                return self._model, self._columns
+
+            start = time.perf_counter()
+            self._model, self._columns = self._load()
+            self._predictor = None
+            self.last_load_seconds = time.perf_counter() - start
+            self._stamps = stamps
+            self._hashes = hashes
+            self.loads += 1
+            return self._model, self._columns
+
+    def predictor(self):
+        """FastPredictor for the current model, rebuilt after a reload."""
+        model, columns = self.get()
+        predictor = self._predictor
+        if predictor is None or predictor.model is not model:
+            predictor = FastPredictor(model, columns)
+            self._predictor = predictor
+        return predictor
+
+    def stats(self):
+        return {
+            'loads': self.loads,
+            'hits': self.hits,
+            'last_load_seconds': self.last_load_seconds,
+            'model_sha256': self._hashes[0] if self._hashes else None,
+            'ignored_inputs': self.ignored_inputs,
+        }
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Shared by every importer in this process
+artifact_cache = ArtifactCache()
+
+
+def verify_fast_path(model, columns, records):
+    """Compare FastPredictor with the DataFrame path; returns mismatching row indices."""
+    predictor = FastPredictor(model, columns)
+    frame = pd.DataFrame(records)
+    expected_codes = predict_frame(model, frame, columns)
+    expected_proba = model.predict_proba(prepare_features(frame, columns))
+    mismatches = []
+    for i, record in enumerate(records):
+        proba = predictor.predict_proba_one(record)
+        if int(np.argmax(proba)) != expected_codes[i] or not np.array_equal(
+            proba.astype(np.float32), expected_proba[i].astype(np.float32)
+        ):
+            mismatches.append(i)
+    return mismatches
+
+
+if __name__ == '__main__':
+    # Check the fast path against the DataFrame path and time both
+    import sys
+
+    path = sys.argv[1] if len(sys.argv) > 1 else 'Dataset - Updated.csv'
+    records = pd.read_csv(path)[INPUT_FIELDS].to_dict('records')
+    model, columns = ArtifactCache().get()
+    mismatches = verify_fast_path(model, columns, records)
+    print(f"{len(records) - len(mismatches)}/{len(records)} rows match")
+
+    predictor = FastPredictor(model, columns)
+    sample = records[: min(len(records), 200)]
+    start = time.perf_counter()
+    for record in sample:
+        predict_frame(model, pd.DataFrame([record]), columns)
+    frame_us = (time.perf_counter() - start) / len(sample) * 1e6
+    start = time.perf_counter()
+    for record in sample:
+        predictor.predict_one(record)
+    fast_us = (time.perf_counter() - start) / len(sample) * 1e6
+    print(f"DataFrame path: {frame_us:.0f} us/row, fast path: {fast_us:.0f} us/row")
+    sys.exit(1 if mismatches else 0)
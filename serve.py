@@ -0,0 +1,596 @@
+# Local HTTP/JSON scoring service with dynamic micro-batching
+#
+# Usage:
+#   python serve.py --port 8600
+#   curl -X POST localhost:8600/predict -d '{"Age": 30, "SystolicBP": 120, ...}'
+#   python serve.py --self-check   # start on a free port and hit it with a local client
+#   python serve.py --processes 4 --shadow artifacts/risk-model-<version> --shadow-log shadow.jsonl
+#
+# With --processes, the parent loads every model version and then forks
+# workers that share the listening socket; the boosters' memory is shared
+# copy-on-write instead of loaded once per worker. --model picks the primary
+# version, which answers requests; each --shadow version scores the same
+# batches on a background thread, off the request path, and its
+# disagreement rate and latency go to /metrics and --shadow-log.
+#
+# Endpoints:
+#   POST /predict  one input object (same 11 fields as the app's user_input dict)
+#   GET  /metrics  latency percentiles, batch sizes, rejection counts, per-version
+#                  latency and shadow disagreement and, with RISK_TIMING=1,
+#                  per-stage timings (see timing.py)
+#   GET  /drift    drift of the inputs served so far against the training data
+#   GET  /health
+import argparse
+import asyncio
+import collections
+import gc
+import json
+import os
+import queue
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import timing
+from drift import shared_monitor
+from prediction_cache import DEFAULT_MAXSIZE, PredictionCache, prediction_cache
+from recommendations import generate_recommendations_frame, thresholds
+from risk_model import COLUMNS_PATH, INPUT_FIELDS, MODEL_PATH, ArtifactCache, predict_frame, risk_label
+
+DEFAULT_MAX_BATCH = 64
+DEFAULT_MAX_WAIT_MS = 5.0
+DEFAULT_QUEUE_SIZE = 1024
+DEFAULT_WORKERS = 2
+LATENCY_WINDOW = 10_000
+# Batches waiting for shadow scoring before new ones are dropped
+SHADOW_QUEUE_SIZE = 256
+SHADOW_LOG_SECONDS = 60.0
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+            500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+class QueueFull(Exception):
+    pass
+
+
+def validate_input(payload):
+    """Return a clean {field: float} dict or raise ValueError."""
+    if not isinstance(payload, dict):
+        raise ValueError("Request body must be a JSON object")
+    missing = [field for field in INPUT_FIELDS if field not in payload]
+    if missing:
+        raise ValueError(f"Missing fields: {missing}")
+    record = {}
+    for field in INPUT_FIELDS:
+        value = payload[field]
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"Field {field!r} must be a number")
+        record[field] = float(value)
+    return record
+
+
+def score_batch(records, cache=prediction_cache):
+    """Score a list of validated input dicts with one predict call."""
+    return _score_frame(pd.DataFrame.from_records(records, columns=INPUT_FIELDS), cache)
+
+
+def _score_frame(frame, cache):
+    with timing.profile_once():
+        codes, proba, recommendations = cache.score_frame(frame)
+        shared_monitor().update(frame)
+    model, _ = cache.artifacts.get()
+    return [
+        {
+            'risk_code': int(code),
+            'risk_level': risk_label(code, model),
+            'probability': float(proba[i, code]),
+            'recommendations': recommendations.iloc[i],
+        }
+        for i, code in enumerate(codes)
+    ]
+
+
+def _version_name(path):
+    return os.path.basename(os.path.normpath(path))
+
+
+class VersionScorer:
+    """Scores batches with a primary model version and compares shadow versions.
+
+    Requests get the primary's results. Each batch is then queued for the
+    shadow versions, which a background thread scores and compares by risk
+    code; when the queue is full the batch is skipped for the shadows
+    (counted as dropped) rather than delaying requests. Latency per batch
+    is kept per version in fixed-bucket histograms.
+    """
+
+    def __init__(self, primary=prediction_cache, shadows=(), log_path=None, log_seconds=SHADOW_LOG_SECONDS,
+                 queue_size=SHADOW_QUEUE_SIZE):
+        self.primary = primary
+        self.shadows = {_version_name(artifacts.model_path): artifacts for artifacts in shadows}
+        self.primary_name = _version_name(primary.artifacts.model_path)
+        if self.primary_name in self.shadows:
+            raise ValueError(f"Shadow version {self.primary_name} is also the primary")
+        self.log_path = log_path
+        self.log_seconds = log_seconds
+        self._lock = threading.Lock()
+        self._latency = {name: timing.Histogram() for name in [self.primary_name, *self.shadows]}
+        self._compared = dict.fromkeys(self.shadows, 0)
+        self._disagreements = dict.fromkeys(self.shadows, 0)
+        self._failures = dict.fromkeys(self.shadows, 0)
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+
+    def load(self):
+        """Load every version now (before forking workers, or the first request)."""
+        self.primary.artifacts.get()
+        for artifacts in self.shadows.values():
+            artifacts.get()
+
+    def start(self):
+        if self._thread is None and (self.shadows or self.log_path):
+            self._thread = threading.Thread(target=self._run, name='shadow-scoring', daemon=True)
+            self._thread.start()
+
+    def __call__(self, records):
+        frame = pd.DataFrame.from_records(records, columns=INPUT_FIELDS)
+        start = time.perf_counter()
+        results = _score_frame(frame, self.primary)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._latency[self.primary_name].observe(elapsed)
+        if self.shadows:
+            codes = np.array([result['risk_code'] for result in results])
+            try:
+                self._queue.put_nowait((frame, codes))
+            except queue.Full:
+                with self._lock:
+                    self.dropped += 1
+        return results
+
+    def _score_shadows(self, frame, codes):
+        for name, artifacts in self.shadows.items():
+            start = time.perf_counter()
+            try:
+                model, columns = artifacts.get()
+                shadow_codes = np.asarray(predict_frame(model, frame, columns))
+            except Exception:
+                with self._lock:
+                    self._failures[name] += 1
+                continue
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._latency[name].observe(elapsed)
+                self._compared[name] += len(codes)
+                self._disagreements[name] += int((shadow_codes != codes).sum())
+
+    def _run(self):
+        next_log = time.monotonic() + self.log_seconds
+        while True:
+            try:
+                frame, codes = self._queue.get(timeout=max(next_log - time.monotonic(), 0.01))
+            except queue.Empty:
+                pass
+            else:
+                self._score_shadows(frame, codes)
+                self._queue.task_done()
+            if self.log_path and time.monotonic() >= next_log:
+                self.write_log()
+                next_log = time.monotonic() + self.log_seconds
+
+    def write_log(self):
+        """Append one JSON line with this process's snapshot to log_path."""
+        line = json.dumps({'timestamp': time.time(), 'pid': os.getpid(), **self.snapshot()})
+        with open(self.log_path, 'a') as f:
+            f.write(line + '\n')
+
+    def snapshot(self):
+        with self._lock:
+            versions = {
+                self.primary_name: {
+                    'role': 'primary',
+                    'model_sha256': self.primary.artifacts.stats()['model_sha256'],
+                    'batch_latency': self._latency[self.primary_name].snapshot(),
+                },
+            }
+            for name, artifacts in self.shadows.items():
+                compared = self._compared[name]
+                versions[name] = {
+                    'role': 'shadow',
+                    'model_sha256': artifacts.stats()['model_sha256'],
+                    'batch_latency': self._latency[name].snapshot(),
+                    'compared': compared,
+                    'disagreements': self._disagreements[name],
+                    'disagreement_rate': self._disagreements[name] / compared if compared else None,
+                    'failures': self._failures[name],
+                }
+            return {'versions': versions, 'shadow_queue': self._queue.qsize(), 'shadow_dropped': self.dropped}
+
+    def drain(self, timeout=10.0):
+        """Wait until queued shadow batches are scored (for checks and shutdown)."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+
+class LatencyStats:
+    """Request latencies over a sliding window plus batch counters."""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.latencies = collections.deque(maxlen=window)
+        self.requests = 0
+        self.rejected = 0
+        self.failed = 0
+        self.batches = 0
+        self.batched_requests = 0
+
+    def record_request(self, seconds):
+        self.requests += 1
+        self.latencies.append(seconds)
+
+    def record_batch(self, size):
+        self.batches += 1
+        self.batched_requests += size
+
+    def snapshot(self):
+        data = np.fromiter(self.latencies, dtype=np.float64) * 1000.0
+        p50, p95, p99 = np.percentile(data, [50, 95, 99]) if data.size else (None, None, None)
+        return {
+            'requests': self.requests,
+            'rejected': self.rejected,
+            'failed': self.failed,
+            'batches': self.batches,
+            'mean_batch_size': self.batched_requests / self.batches if self.batches else None,
+            'latency_ms': {'p50': p50, 'p95': p95, 'p99': p99, 'window': int(data.size)},
+        }
+
+
+class MicroBatcher:
+    """Coalesces concurrent requests into batches flushed by size or deadline.
+
+    The bounded queue provides backpressure: submit() raises QueueFull
+    instead of letting pending work grow without limit.
+    """
+
+    def __init__(self, score_fn=score_batch, max_batch=DEFAULT_MAX_BATCH,
+                 max_wait_ms=DEFAULT_MAX_WAIT_MS, queue_size=DEFAULT_QUEUE_SIZE,
+                 workers=DEFAULT_WORKERS, stats=None):
+        self.score_fn = score_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.workers = workers
+        self.stats = stats or LatencyStats()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='scoring')
+        self._tasks = []
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._executor.shutdown(wait=False)
+
+    async def submit(self, record):
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((record, future))
+        except asyncio.QueueFull:
+            self.stats.rejected += 1
+            raise QueueFull() from None
+        return await future
+
+    async def _collect(self):
+        batch = [await self.queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            records = [record for record, _ in batch]
+            try:
+                results = await loop.run_in_executor(self._executor, self.score_fn, records)
+            except Exception as exc:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+                continue
+            self.stats.record_batch(len(batch))
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+
+class ScoringServer:
+    def __init__(self, batcher, host='127.0.0.1', port=8600, versions=None, sock=None):
+        self.batcher = batcher
+        self.host = host
+        self.port = port
+        self.versions = versions
+        # An already listening socket (shared by forked workers) instead of host/port
+        self.sock = sock
+        self._server = None
+
+    async def start(self):
+        # Build the drift reference before the first request needs it
+        shared_monitor()
+        if self.versions is not None:
+            self.versions.start()
+        self.batcher.start()
+        if self.sock is not None:
+            self._server = await asyncio.start_server(self._handle, sock=self.sock)
+        else:
+            self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+        await self.batcher.stop()
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                status, payload = await self._dispatch(method, path, body)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                _write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method, path, body):
+        if path == '/health':
+            return 200, {'status': 'ok'}
+        if path == '/metrics':
+            cache = self.versions.primary if self.versions is not None else prediction_cache
+            metrics = dict(
+                self.batcher.stats.snapshot(),
+                pid=os.getpid(),
+                prediction_cache=cache.stats(),
+                drift_alert=shared_monitor().report()['alert'],
+            )
+            if self.versions is not None:
+                metrics.update(self.versions.snapshot())
+            if timing.ENABLED:
+                metrics['stages'] = timing.snapshot()
+            return 200, metrics
+        if path == '/drift':
+            return 200, shared_monitor().report()
+        if path != '/predict':
+            return 404, {'error': f"Unknown path {path}"}
+        if method != 'POST':
+            return 405, {'error': "Use POST"}
+
+        start = time.perf_counter()
+        try:
+            record = validate_input(json.loads(body or b'null'))
+        except (ValueError, json.JSONDecodeError) as exc:
+            return 400, {'error': str(exc)}
+        try:
+            result = await self.batcher.submit(record)
+        except QueueFull:
+            return 503, {'error': "Scoring queue is full, retry later"}
+        except Exception as exc:
+            # The whole batch failed; answer instead of dropping the connection
+            self.batcher.stats.failed += 1
+            return 500, {'error': f"Scoring failed: {exc}"}
+        self.batcher.stats.record_request(time.perf_counter() - start)
+        return 200, result
+
+
+async def _read_request(reader):
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    method, path, _ = request_line.decode('latin-1').split(' ', 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get('content-length', 0))
+    body = await reader.readexactly(length) if length else b''
+    return method.upper(), path.split('?', 1)[0], headers, body
+
+
+def _write_response(writer, status, payload, keep_alive):
+    body = json.dumps(payload).encode()
+    head = (
+        f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    writer.write(head.encode('latin-1') + body)
+
+
+async def request(host, port, method, path, payload=None):
+    """Minimal local client: returns (status, decoded JSON body)."""
+    reader, writer = await asyncio.open_connection(host, port)
+    body = json.dumps(payload).encode() if payload is not None else b''
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n"
+        f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode('latin-1') + body
+    )
+    await writer.drain()
+    status_line = await reader.readline()
+    status = int(status_line.split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    data = await reader.readexactly(length)
+    writer.close()
+    return status, json.loads(data)
+
+
+async def _self_check(args):
+    # Fire the dataset at the service concurrently and compare with direct scoring
+    records = pd.read_csv(args.dataset)[INPUT_FIELDS].to_dict('records')
+    versions = _make_versions(args)
+    server = ScoringServer(_make_batcher(args, versions), host='127.0.0.1', port=0, versions=versions)
+    await server.start()
+    clients = asyncio.Semaphore(args.clients)
+
+    async def call(record):
+        async with clients:
+            return await request('127.0.0.1', server.port, 'POST', '/predict', record)
+
+    try:
+        responses = await asyncio.gather(*(call(record) for record in records))
+        await asyncio.get_running_loop().run_in_executor(None, versions.drain)
+        _, metrics = await request('127.0.0.1', server.port, 'GET', '/metrics')
+    finally:
+        await server.stop()
+
+    # Expected results straight from the model and the rules, bypassing the
+    # cache under test and the drift monitor the requests already fed
+    frame = pd.DataFrame.from_records(records, columns=INPUT_FIELDS)
+    model, columns = versions.primary.artifacts.get()
+    codes = np.asarray(predict_frame(model, frame, columns)).tolist()
+    recommendations = generate_recommendations_frame(frame, thresholds).tolist()
+    mismatches = sum(
+        status != 200 or body['risk_code'] != code or body['recommendations'] != recs
+        for (status, body), code, recs in zip(responses, codes, recommendations)
+    )
+    print(json.dumps(metrics, indent=2))
+    print(f"{len(records) - mismatches}/{len(records)} responses match direct scoring")
+    return 1 if mismatches else 0
+
+
+def _make_versions(args):
+    primary = prediction_cache
+    if args.model != MODEL_PATH:
+        primary = PredictionCache(DEFAULT_MAXSIZE, ArtifactCache(args.model, args.columns))
+    shadows = [ArtifactCache(path, args.columns) for path in args.shadow]
+    return VersionScorer(primary, shadows, args.shadow_log, args.shadow_log_seconds)
+
+
+def _make_batcher(args, versions):
+    return MicroBatcher(
+        score_fn=versions,
+        max_batch=args.max_batch,
+        max_wait_ms=args.max_wait_ms,
+        queue_size=args.queue_size,
+        workers=args.workers,
+    )
+
+
+async def _serve(args, versions, sock=None):
+    server = ScoringServer(_make_batcher(args, versions), host=args.host, port=args.port, versions=versions, sock=sock)
+    await server.start()
+    print(f"Serving on http://{args.host}:{server.port} (pid {os.getpid()})", file=sys.stderr)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+def _serve_forked(args, versions):
+    """Load every version here, then fork args.processes workers onto one listening socket.
+
+    Boosters live in native memory that the workers only read, so after
+    fork their pages stay shared. gc.freeze() keeps the collector from
+    touching (and so copying) the parent's objects. Nothing is predicted
+    before forking, so no OpenMP thread pool exists in the parent.
+    """
+    versions.load()
+    shared_monitor()
+    sock = socket.create_server((args.host, args.port), backlog=1024)
+    gc.freeze()
+    children = []
+    for _ in range(args.processes):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, lambda *_: os._exit(0))
+            try:
+                asyncio.run(_serve(args, versions, sock))
+            except KeyboardInterrupt:
+                pass
+            finally:
+                os._exit(0)
+        children.append(pid)
+    sock.close()
+    # Stop the workers on SIGTERM as on Ctrl-C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        for pid in children:
+            os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve risk predictions over local HTTP with micro-batching.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8600)
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="Concurrent scoring batches")
+    parser.add_argument('--max-batch', type=int, default=DEFAULT_MAX_BATCH, help="Flush a batch at this size")
+    parser.add_argument('--max-wait-ms', type=float, default=DEFAULT_MAX_WAIT_MS, help="Flush a batch after this delay")
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE, help="Pending requests before 503")
+    parser.add_argument('--model', default=MODEL_PATH, help="Primary model version (pickle or artifact directory)")
+    parser.add_argument('--columns', default=COLUMNS_PATH, help="Feature columns for pickled models")
+    parser.add_argument('--shadow', action='append', default=[], metavar='MODEL',
+                        help="Shadow model version scored alongside the primary (repeatable)")
+    parser.add_argument('--shadow-log', help="Append per-version latency and disagreement as JSON lines here")
+    parser.add_argument('--shadow-log-seconds', type=float, default=SHADOW_LOG_SECONDS)
+    parser.add_argument('--processes', type=int, default=1,
+                        help="Forked worker processes sharing the socket and the loaded models")
+    parser.add_argument('--self-check', action='store_true', help="Run a local client against a temporary server")
+    parser.add_argument('--dataset', default='Dataset - Updated.csv', help="Records used by --self-check")
+    parser.add_argument('--clients', type=int, default=200, help="Concurrent clients used by --self-check")
+    args = parser.parse_args(argv)
+
+    timing.start_from_env()
+    if args.self_check:
+        sys.exit(asyncio.run(_self_check(args)))
+    versions = _make_versions(args)
+    if args.processes > 1:
+        _serve_forked(args, versions)
+        return
+    try:
+        asyncio.run(_serve(args, versions))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
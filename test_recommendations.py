@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from recommendations import (
+    RECOMMENDATION_TEXT,
+    generate_recommendations,
+    generate_recommendations_frame,
+    thresholds,
+)
+
+DATASET_PATH = 'Dataset - Updated.csv'
+
+
+def baseline_recommendations(input_data):
+    # Frozen copy of the original scalar rules in preghealth.py, the reference
+    # these tests hold both generators to. The only deliberate change is
+    # the fever/hypothermia cut-offs, which compared the °F input with °C
+    # values (38/35) and now use 100.4/95.0 °F. Do not edit to match the
+    # band table.
+    recommendations = []
+    if pd.notna(input_data['Age']):
+        if input_data['Age'] >= 35:
+            recommendations.append(RECOMMENDATION_TEXT['advanced_maternal_age'])
+        elif input_data['Age'] < 20:
+            recommendations.append(RECOMMENDATION_TEXT['adolescent_pregnancy'])
+    if pd.notna(input_data['SystolicBP']) and pd.notna(input_data['DiastolicBP']):
+        sys, dia = input_data['SystolicBP'], input_data['DiastolicBP']
+        if sys >= 140 or dia >= 90:
+            recommendations.append(RECOMMENDATION_TEXT['hypertension_stage2'])
+        elif 130 <= sys < 140 or 80 <= dia < 90:
+            recommendations.append(RECOMMENDATION_TEXT['hypertension_stage1'])
+        elif sys < 90 or dia < 60:
+            recommendations.append(RECOMMENDATION_TEXT['hypotension'])
+    if pd.notna(input_data['BS']):
+        if input_data['BS'] >= 15.0:
+            recommendations.append(RECOMMENDATION_TEXT['hyperglycemia'])
+        elif input_data['BS'] <= 4.0:
+            recommendations.append(RECOMMENDATION_TEXT['hypoglycemia'])
+    if pd.notna(input_data['Preexisting Diabetes']) and input_data['Preexisting Diabetes'] == 1:
+        recommendations.append(RECOMMENDATION_TEXT['preexisting_diabetes'])
+    if pd.notna(input_data['Gestational Diabetes']) and input_data['Gestational Diabetes'] == 1:
+        recommendations.append(RECOMMENDATION_TEXT['gestational_diabetes'])
+    if pd.notna(input_data['BodyTemp']):
+        if input_data['BodyTemp'] >= 100.4:
+            recommendations.append(RECOMMENDATION_TEXT['fever'])
+        elif input_data['BodyTemp'] < 95.0:
+            recommendations.append(RECOMMENDATION_TEXT['hypothermia'])
+    if pd.notna(input_data['HeartRate']):
+        if input_data['HeartRate'] > 100:
+            recommendations.append(RECOMMENDATION_TEXT['tachycardia'])
+        elif input_data['HeartRate'] < 60:
+            recommendations.append(RECOMMENDATION_TEXT['bradycardia'])
+    if pd.notna(input_data['BMI']):
+        if input_data['BMI'] >= 30:
+            recommendations.append(RECOMMENDATION_TEXT['obesity'])
+        elif input_data['BMI'] < 18.5:
+            recommendations.append(RECOMMENDATION_TEXT['underweight'])
+    if pd.notna(input_data['Previous Complications']) and input_data['Previous Complications'] == 1:
+        recommendations.append(RECOMMENDATION_TEXT['previous_complications'])
+    if pd.notna(input_data['Mental Health']) and input_data['Mental Health'] == 1:
+        recommendations.append(RECOMMENDATION_TEXT['mental_health'])
+    if any(x for x in recommendations if 'pregnancy' in x.lower() or 'glucose' in x.lower()):
+        recommendations.append(RECOMMENDATION_TEXT['prenatal_reminder'])
+    if not recommendations:
+        recommendations.append(RECOMMENDATION_TEXT['all_normal'])
+    return '; '.join(recommendations)
+
+
+def boundary_rows(data, n, seed=0):
+    # Rows whose values are drawn from the dataset's values and every cut-off
+    # in thresholds (and its neighbours), so each rule boundary is exercised.
+    # 0/1 flags stay 0, 1 or missing.
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for name in data.columns:
+        values = data[name].dropna().unique().tolist() + [np.nan]
+        if set(values[:-1]) <= {0, 1}:
+            columns[name] = rng.choice(np.asarray(values, dtype=np.float64), n)
+            continue
+        for cutoff in thresholds.get(name, {}).values():
+            values += [cutoff - 1, cutoff - 0.1, cutoff, cutoff + 0.1, cutoff + 1]
+        columns[name] = rng.choice(np.asarray(values, dtype=np.float64), n)
+    return pd.DataFrame(columns)
+
+
+@pytest.fixture(scope='module')
+def rows():
+    data = pd.read_csv(DATASET_PATH).drop(columns=['RiskLevel'])
+    return pd.concat([data, boundary_rows(data, 30_000)], ignore_index=True)
+
+
+def test_frame_generator_matches_baseline_rules(rows):
+    expected = rows.apply(baseline_recommendations, axis=1)
+    actual = generate_recommendations_frame(rows, thresholds)
+    assert (actual == expected).all(), rows[actual != expected].head()
+
+
+def test_scalar_generator_matches_baseline_rules(rows):
+    sample = rows.sample(5_000, random_state=0)
+    expected = sample.apply(baseline_recommendations, axis=1)
+    actual = sample.apply(lambda row: generate_recommendations(row, thresholds), axis=1)
+    assert (actual == expected).all(), sample[actual != expected].head()
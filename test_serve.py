@@ -0,0 +1,41 @@
+import asyncio
+
+from prediction_cache import PredictionCache
+from serve import MicroBatcher, ScoringServer, request, score_batch
+
+RECORD = {
+    'Age': 30, 'SystolicBP': 120, 'DiastolicBP': 80, 'BS': 7.0, 'BodyTemp': 98.0, 'HeartRate': 75,
+    'BMI': 23.0, 'Previous Complications': 0, 'Preexisting Diabetes': 0, 'Gestational Diabetes': 0,
+    'Mental Health': 0,
+}
+
+
+def _failing_scorer(records):
+    raise RuntimeError("model exploded")
+
+
+async def _predict_twice(score_fn):
+    server = ScoringServer(MicroBatcher(score_fn=score_fn, max_wait_ms=1), port=0)
+    await server.start()
+    try:
+        first = await request('127.0.0.1', server.port, 'POST', '/predict', RECORD)
+        second = await request('127.0.0.1', server.port, 'POST', '/predict', RECORD)
+        _, metrics = await request('127.0.0.1', server.port, 'GET', '/metrics')
+    finally:
+        await server.stop()
+    return first, second, metrics
+
+
+def test_scoring_failure_returns_500():
+    first, second, metrics = asyncio.run(_predict_twice(_failing_scorer))
+    assert first == (500, {'error': "Scoring failed: model exploded"})
+    # The server keeps answering after a failed batch
+    assert second[0] == 500
+    assert metrics['failed'] == 2
+
+
+def test_every_predicted_class_is_labelled():
+    # The shipped model predicts a third class risk_map has no label for
+    results = score_batch([RECORD, dict(RECORD, SystolicBP=160, BS=18.0)], PredictionCache(0))
+    assert results[1]['risk_code'] == 2
+    assert all(isinstance(result['risk_level'], str) for result in results)
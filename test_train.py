@@ -0,0 +1,28 @@
+import io
+import json
+import os
+
+from train import train_streaming, update_model
+
+
+def test_streaming_matches_in_memory_training(tmp_path):
+    # Small chunks, so the quantile sketch and class counts span several chunks
+    path = train_streaming(out_dir=str(tmp_path), chunksize=300, check=True, log=io.StringIO())
+    with open(os.path.join(path, 'metrics.json')) as f:
+        report = json.load(f)['in_memory_check']
+    assert report['passed']
+    assert report['agreement'] >= 0.99
+
+
+def test_update_rejected_when_original_holdout_degrades(tmp_path):
+    # Refreshing a model built on the first 800 records with all 1166 helps
+    # the new holdout but costs the original one far more than the tolerance
+    with open('Dataset - Updated.csv') as f:
+        lines = f.readlines()
+    dataset = tmp_path / 'records.csv'
+    dataset.write_text(''.join(lines[:801]))
+    base = train_streaming(str(dataset), out_dir=str(tmp_path), log=io.StringIO())
+    dataset.write_text(''.join(lines))
+    log = io.StringIO()
+    assert update_model(base, str(dataset), out_dir=str(tmp_path), refresh=True, tolerance=0.05, log=log) is None
+    assert 'original holdout' in log.getvalue()
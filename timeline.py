@@ -0,0 +1,286 @@
+# Per-patient visit timelines with sliding-window aggregates and incremental re-scoring
+#
+# Visits arrive as records with PatientID, VisitDate and the 11 input fields.
+# Each patient keeps the visits of the last WINDOW_DAYS days (relative to their
+# latest visit) and a few trend aggregates over them. The model and the
+# recommendations see the latest visit's inputs, so evaluate() re-scores only
+# patients whose latest inputs changed since they were last scored (or
+# everyone, after a model change).
+#
+# Usage:
+#   python timeline.py visits.csv --state timeline.json --output rescored.csv
+#   python timeline.py --self-check          # replay the dataset as daily visits
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from prediction_cache import prediction_cache
+from risk_model import INPUT_FIELDS, risk_label
+
+PATIENT_ID = 'PatientID'
+VISIT_DATE = 'VisitDate'
+WINDOW_DAYS = 28
+INGEST_CHUNKSIZE = 50_000
+
+# Aggregates kept per patient over the window
+AGGREGATES = ['Visits', 'SystolicBP_trend', 'DiastolicBP_trend', 'SystolicBP_max', 'BS_max']
+
+
+def _slope_per_week(days, values):
+    # Least-squares slope; None until there are two distinct visit days
+    days = np.asarray(days, dtype=np.float64)
+    if len(days) < 2 or days.min() == days.max():
+        return None
+    values = np.asarray(values, dtype=np.float64)
+    centered = days - days.mean()
+    return float((centered * (values - values.mean())).sum() / (centered ** 2).sum() * 7)
+
+
+class PatientTimeline:
+    """Visits of one patient inside the window, oldest first."""
+
+    __slots__ = ('visits', 'aggregates', 'scored_inputs', 'result')
+
+    def __init__(self):
+        # (day number, input tuple in INPUT_FIELDS order)
+        self.visits = []
+        self.aggregates = {}
+        self.scored_inputs = None
+        self.result = None
+
+    @property
+    def latest(self):
+        return self.visits[-1][1]
+
+    def add(self, day, inputs, window_days=WINDOW_DAYS):
+        if not self.visits or day >= self.visits[-1][0]:
+            self.visits.append((day, inputs))
+        else:
+            # Late record: keep the list in visit order
+            position = next(i for i, (other, _) in enumerate(self.visits) if other > day)
+            self.visits.insert(position, (day, inputs))
+        cutoff = self.visits[-1][0] - window_days
+        start = 0
+        while self.visits[start][0] < cutoff:
+            start += 1
+        if start:
+            del self.visits[:start]
+        self._aggregate()
+
+    def _aggregate(self):
+        days = [day for day, _ in self.visits]
+        sbp = [inputs[_SBP] for _, inputs in self.visits]
+        dbp = [inputs[_DBP] for _, inputs in self.visits]
+        self.aggregates = {
+            'Visits': len(self.visits),
+            'SystolicBP_trend': _slope_per_week(days, sbp),
+            'DiastolicBP_trend': _slope_per_week(days, dbp),
+            'SystolicBP_max': max(sbp),
+            'BS_max': max(inputs[_BS] for _, inputs in self.visits),
+        }
+
+    @property
+    def changed(self):
+        return self.latest != self.scored_inputs
+
+
+_SBP = INPUT_FIELDS.index('SystolicBP')
+_DBP = INPUT_FIELDS.index('DiastolicBP')
+_BS = INPUT_FIELDS.index('BS')
+_EPOCH = np.datetime64('1970-01-01', 'D')
+
+
+def _day_numbers(dates):
+    return (pd.to_datetime(dates).to_numpy().astype('datetime64[D]') - _EPOCH).astype(np.int64)
+
+
+class TimelineStore:
+    """Patient timelines keyed by patient ID, with a set of patients due for re-scoring."""
+
+    def __init__(self, window_days=WINDOW_DAYS, cache=prediction_cache):
+        self.window_days = window_days
+        self.cache = cache
+        self.patients = {}
+        self.model_sha256 = None
+        self._pending = set()
+
+    def ingest(self, visits):
+        """Add a frame of visit records; returns the number of patients now pending."""
+        missing = [name for name in [PATIENT_ID, VISIT_DATE] + INPUT_FIELDS if name not in visits.columns]
+        if missing:
+            raise ValueError(f"Visits are missing required columns: {missing}")
+        days = _day_numbers(visits[VISIT_DATE])
+        values = visits[INPUT_FIELDS].to_numpy(dtype=np.float64).tolist()
+        for patient_id, day, inputs in zip(visits[PATIENT_ID].astype(str).tolist(), days.tolist(), values):
+            patient = self.patients.get(patient_id)
+            if patient is None:
+                patient = self.patients[patient_id] = PatientTimeline()
+            patient.add(day, tuple(inputs), self.window_days)
+            if patient.changed:
+                self._pending.add(patient_id)
+            else:
+                # Back to the inputs it was last scored on
+                self._pending.discard(patient_id)
+        return len(self._pending)
+
+    @property
+    def pending(self):
+        return sorted(self._pending)
+
+    def evaluate(self, rescore_all=False):
+        """Score pending patients in one batch and return their rows.
+
+        Every patient is pending after the model changes, since their
+        stored results came from the previous one.
+        """
+        model, _ = self.cache.artifacts.get()
+        model_sha256 = self.cache.artifacts.stats()['model_sha256']
+        if rescore_all or model_sha256 != self.model_sha256:
+            self._pending = set(self.patients)
+            self.model_sha256 = model_sha256
+        ids = sorted(self._pending)
+        if not ids:
+            return self._frame([])
+
+        latest = [self.patients[patient_id].latest for patient_id in ids]
+        codes, proba, recommendations = self.cache.score_frame(pd.DataFrame(latest, columns=INPUT_FIELDS))
+        for i, patient_id in enumerate(ids):
+            patient = self.patients[patient_id]
+            code = int(codes[i])
+            patient.scored_inputs = patient.latest
+            patient.result = {
+                'PredictedRiskCode': code,
+                'PredictedRisk': risk_label(code, model),
+                'Probability': float(proba[i, code]),
+                'Recommendations': recommendations.iloc[i],
+            }
+        self._pending.clear()
+        return self._frame(ids)
+
+    def _frame(self, ids):
+        rows = []
+        for patient_id in ids:
+            patient = self.patients[patient_id]
+            row = {PATIENT_ID: patient_id, VISIT_DATE: str(_EPOCH + patient.visits[-1][0])}
+            row.update(zip(INPUT_FIELDS, patient.latest))
+            row.update(patient.aggregates)
+            row.update(patient.result or {})
+            rows.append(row)
+        columns = [PATIENT_ID, VISIT_DATE] + INPUT_FIELDS + AGGREGATES + [
+            'PredictedRiskCode', 'PredictedRisk', 'Probability', 'Recommendations',
+        ]
+        return pd.DataFrame(rows, columns=columns)
+
+    def snapshot(self):
+        """Latest inputs, aggregates and last result of every patient."""
+        return self._frame(sorted(self.patients))
+
+    def save(self, path):
+        state = {
+            'window_days': self.window_days,
+            'model_sha256': self.model_sha256,
+            'pending': sorted(self._pending),
+            'patients': {
+                patient_id: {
+                    'visits': patient.visits,
+                    'scored_inputs': patient.scored_inputs,
+                    'result': patient.result,
+                }
+                for patient_id, patient in self.patients.items()
+            },
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, cache=prediction_cache):
+        with open(path) as f:
+            state = json.load(f)
+        store = cls(state['window_days'], cache)
+        store.model_sha256 = state['model_sha256']
+        store._pending = set(state['pending'])
+        for patient_id, saved in state['patients'].items():
+            patient = store.patients[patient_id] = PatientTimeline()
+            patient.visits = [(day, tuple(inputs)) for day, inputs in saved['visits']]
+            patient.scored_inputs = tuple(saved['scored_inputs']) if saved['scored_inputs'] is not None else None
+            patient.result = saved['result']
+            patient._aggregate()
+        return store
+
+
+def _self_check(dataset, patients=200, log=sys.stderr):
+    # Replay the dataset as daily visits of a fixed caseload, where each day
+    # only some patients are seen, and compare with re-scoring everyone
+    records = pd.read_csv(dataset)[INPUT_FIELDS]
+    records[PATIENT_ID] = [f"P{i % patients:04d}" for i in range(len(records))]
+    records[VISIT_DATE] = pd.Timestamp('2026-01-01') + pd.to_timedelta(np.arange(len(records)) // 40, unit='D')
+
+    store = TimelineStore()
+    rescored = full_daily = 0
+    for _, day in records.groupby(VISIT_DATE, sort=True):
+        store.ingest(day)
+        rescored += len(store.evaluate())
+        full_daily += len(store.patients)
+    # A repeated visit with the same inputs must not trigger work
+    store.ingest(records.tail(40))
+    repeated = len(store.evaluate())
+
+    full = store.snapshot()
+    codes, _, recommendations = prediction_cache.score_frame(full[INPUT_FIELDS])
+    mismatches = int((codes != full['PredictedRiskCode'].to_numpy()).sum())
+    mismatches += int((recommendations.to_numpy() != full['Recommendations'].to_numpy()).sum())
+    print(
+        f"{len(records)} visits over {records[VISIT_DATE].nunique()} days, {len(store.patients)} patients: "
+        f"{rescored} re-scorings instead of {full_daily} for daily full re-scoring, "
+        f"{repeated} after replaying unchanged visits, {mismatches} mismatches against full re-scoring",
+        file=log,
+    )
+    return 1 if mismatches or repeated else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest visits and re-score patients whose inputs changed.")
+    parser.add_argument('visits', nargs='?', help="CSV with PatientID, VisitDate and the input fields")
+    parser.add_argument('--state', default='timeline.json', help="Timeline state, created if missing")
+    parser.add_argument('--output', help="Write the re-scored patients here (CSV)")
+    parser.add_argument('--window-days', type=int, default=WINDOW_DAYS)
+    parser.add_argument('--rescore-all', action='store_true', help="Re-score every patient")
+    parser.add_argument('--chunksize', type=int, default=INGEST_CHUNKSIZE)
+    parser.add_argument('--self-check', action='store_true', help="Replay the dataset as daily visits")
+    parser.add_argument('--dataset', default='Dataset - Updated.csv', help="Records used by --self-check")
+    args = parser.parse_args(argv)
+
+    if args.self_check:
+        sys.exit(_self_check(args.dataset))
+    if not args.visits:
+        parser.error("visits is required unless --self-check is given")
+
+    start = time.perf_counter()
+    if os.path.exists(args.state):
+        store = TimelineStore.load(args.state)
+    else:
+        store = TimelineStore(args.window_days)
+    visits = 0
+    for chunk in pd.read_csv(args.visits, chunksize=args.chunksize):
+        store.ingest(chunk)
+        visits += len(chunk)
+    rescored = store.evaluate(args.rescore_all)
+    store.save(args.state)
+    if args.output:
+        rescored.to_csv(args.output, index=False)
+    print(
+        f"Ingested {visits} visits; re-scored {len(rescored)} of {len(store.patients)} patients "
+        f"in {time.perf_counter() - start:.2f}s",
+        file=sys.stderr,
+    )
+
+
+if __name__ == '__main__':
+    main()
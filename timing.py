@@ -0,0 +1,250 @@
+# Per-stage latency histograms for the app, batch tools and server
+#
+# Off by default. Environment variables:
+#   RISK_TIMING=1                    record stage timings
+#   RISK_METRICS_PORT=9464           serve them on http://127.0.0.1:<port>/metrics
+#                                    (Prometheus text; /metrics.json for JSON)
+#   RISK_TIMING_DUMP=stages.json     write a JSON snapshot there periodically
+#   RISK_TIMING_DUMP_SECONDS=60      ... every this many seconds
+#   RISK_PROFILE=predict.prof        cProfile the next profiled request once
+#
+# When timing is off, timed() returns the function unchanged and stage() hands
+# back a shared no-op context, so instrumented code pays nothing measurable.
+import bisect
+import contextlib
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ENABLED = os.environ.get('RISK_TIMING', '') not in ('', '0')
+
+# Bucket upper bounds in seconds, from 50us to 10s
+BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+_NULL_CONTEXT = contextlib.nullcontext()
+
+
+class Histogram:
+    """Fixed-bucket latency histogram (count, sum, max and per-bucket counts)."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def cumulative(self):
+        """(upper bound, observations <= bound) pairs, ending with +Inf."""
+        total = 0
+        out = []
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            out.append((bound, total))
+        return out
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-quantile; max for the overflow bucket
+        if not self.count:
+            return None
+        rank = q * self.count
+        for bound, total in self.cumulative():
+            if total >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count else None,
+            'max': self.max,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+        }
+
+
+_histograms = {}
+_lock = threading.Lock()
+
+
+def observe(name, seconds):
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.observe(seconds)
+
+
+class _Stage:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def stage(name):
+    """Context manager timing its block as stage name."""
+    return _Stage(name) if ENABLED else _NULL_CONTEXT
+
+
+def timed(name):
+    """Decorator timing every call as stage name; a no-op when timing is off."""
+    def decorate(fn):
+        if not ENABLED:
+            return fn
+
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                observe(name, time.perf_counter() - start)
+
+        wrapper.__name__ = fn.__name__
+        wrapper.__qualname__ = fn.__qualname__
+        wrapper.__doc__ = fn.__doc__
+        wrapper.__wrapped__ = fn
+        return wrapper
+    return decorate
+
+
+def snapshot():
+    """Summary of every stage recorded so far."""
+    with _lock:
+        return {name: histogram.snapshot() for name, histogram in sorted(_histograms.items())}
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+
+
+def prometheus_text(metric='risk_stage_seconds'):
+    """All stage histograms in the Prometheus text exposition format."""
+    lines = [
+        f"# HELP {metric} Time spent in each stage of risk scoring.",
+        f"# TYPE {metric} histogram",
+    ]
+    with _lock:
+        for name, histogram in sorted(_histograms.items()):
+            label = name.replace('\\', '\\\\').replace('"', '\\"')
+            for bound, total in histogram.cumulative():
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{metric}_bucket{{stage="{label}",le="{le}"}} {total}')
+            lines.append(f'{metric}_sum{{stage="{label}"}} {histogram.sum!r}')
+            lines.append(f'{metric}_count{{stage="{label}"}} {histogram.count}')
+    return '\n'.join(lines) + '\n'
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path == '/metrics':
+            body, content_type = prometheus_text().encode(), 'text/plain; version=0.0.4'
+        elif path == '/metrics.json':
+            body, content_type = json.dumps(snapshot()).encode(), 'application/json'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, host='127.0.0.1'):
+    """Serve /metrics and /metrics.json from a daemon thread; returns the server."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='stage-metrics', daemon=True).start()
+    return server
+
+
+def dump_json(path):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({'timestamp': time.time(), 'stages': snapshot()}, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def start_json_dump(path, interval=60.0):
+    """Rewrite path with a snapshot every interval seconds from a daemon thread."""
+    def loop():
+        while True:
+            time.sleep(interval)
+            dump_json(path)
+
+    threading.Thread(target=loop, name='stage-metrics-dump', daemon=True).start()
+
+
+_started = False
+
+
+def start_from_env():
+    """Start the exporters configured by environment variables, once per process."""
+    global _started
+    with _lock:
+        if _started or not ENABLED:
+            return
+        _started = True
+    port = os.environ.get('RISK_METRICS_PORT')
+    if port:
+        start_http_server(int(port))
+    dump_path = os.environ.get('RISK_TIMING_DUMP')
+    if dump_path:
+        start_json_dump(dump_path, float(os.environ.get('RISK_TIMING_DUMP_SECONDS', 60)))
+
+
+@contextlib.contextmanager
+def profile(path=None, limit=25):
+    """cProfile the block; write stats to path, or print the top entries to stderr."""
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        if path:
+            profiler.dump_stats(path)
+        else:
+            pstats.Stats(profiler, stream=sys.stderr).sort_stats('cumulative').print_stats(limit)
+
+
+_profile_path = os.environ.get('RISK_PROFILE')
+
+
+def profile_once():
+    """profile(RISK_PROFILE) the first time it is called in this process, else a no-op."""
+    global _profile_path
+    with _lock:
+        path, _profile_path = _profile_path, None
+    return profile(path) if path else _NULL_CONTEXT
@@ -0,0 +1,586 @@
+# Reproducible training pipeline (replaces the grid search in the notebook)
+#
+# Usage:
+#   python train.py                          # writes artifacts/risk-model-<version>/
+#   python train.py --install                # also replaces the app's model and columns.json
+#   python train.py --stream --chunksize 100000   # out-of-core, for datasets larger than RAM
+#   python train.py --stream --check         # ... and require it to match in-memory training
+#   python train.py --update artifacts/risk-model-<version>   # boost on rows appended since that version
+#
+# The artifact directory holds the native model and schema (see artifact.py)
+# plus metrics.json; point RISK_MODEL_PATH at it to serve it directly.
+import argparse
+import hashlib
+import json
+import os
+import resource
+import sys
+import time
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from imblearn.over_sampling import SMOTE
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.metrics import accuracy_score, classification_report, confusion_matrix, recall_score
+from sklearn.model_selection import HalvingGridSearchCV, train_test_split
+from xgboost import XGBClassifier
+
+from artifact import feature_schema, load_artifact, save_artifact as save_native_artifact
+from dataset import HOLDOUT_SEED, HOLDOUT_SIZE, holdout_mask, iter_dataset, load_dataset
+from risk_model import COLUMNS_PATH, MODEL_PATH, risk_map
+
+DATASET_PATH = 'Dataset - Updated.csv'
+ARTIFACTS_DIR = 'artifacts'
+RANDOM_STATE = HOLDOUT_SEED
+TEST_SIZE = HOLDOUT_SIZE
+STREAM_CHUNKSIZE = 100_000
+# Largest holdout accuracy/recall gap, and smallest share of holdout rows
+# predicted alike, between streaming and in-memory training of one recipe
+STREAM_TOLERANCE = 0.01
+STREAM_MIN_AGREEMENT = 0.99
+UPDATE_ROUNDS = 20
+# Largest drop in holdout accuracy or high-risk recall an update may cause
+UPDATE_TOLERANCE = 0.01
+
+# Target encoding used by the notebook
+LABEL_MAP = {'low risk': 0, 'high risk': 1}
+
+# Same search space as the notebook's GridSearchCV
+PARAM_GRID = {
+    'n_estimators': [50, 100, 200],
+    'learning_rate': [0.01, 0.1, 0.2],
+    'max_depth': [3, 5, 7],
+    'subsample': [0.8, 1.0],
+    'colsample_bytree': [0.8, 1.0],
+}
+
+# Streaming mode skips the search; these are the installed model's hyperparameters
+STREAM_PARAMS = {'n_estimators': 100, 'learning_rate': 0.1, 'max_depth': 6}
+
+
+def load_training_data(path=DATASET_PATH, skip_rows=0):
+    """Features and encoded target, imputed the way the notebook does.
+
+    skip_rows drops that many leading records, leaving only appended ones;
+    those are read chunk by chunk, so only the tail is ever held in memory.
+    Rows come from the typed dataset cache (see dataset.py).
+    """
+    if skip_rows:
+        df = _read_tail(path, skip_rows)
+    else:
+        df = load_dataset(path, exact=True)
+    X = df.drop(columns=['RiskLevel'])
+    y = df['RiskLevel'].map(LABEL_MAP)
+    if df.empty:
+        return X, y
+
+    numeric_cols = X.select_dtypes(include=[np.number]).columns
+    X[numeric_cols] = X[numeric_cols].fillna(X[numeric_cols].mean())
+    categorical_cols = X.select_dtypes(exclude=[np.number]).columns
+    for col in categorical_cols:
+        X[col] = X[col].fillna(X[col].mode()[0])
+    return X, y
+
+
+def _read_tail(path, skip_rows, chunksize=STREAM_CHUNKSIZE):
+    # Records from skip_rows on, without materializing the ones before it
+    tail, empty, offset = [], None, 0
+    for chunk in iter_dataset(path, chunksize):
+        start = max(skip_rows - offset, 0)
+        offset += len(chunk)
+        if start < len(chunk):
+            tail.append(chunk.iloc[start:])
+        empty = chunk.iloc[:0]
+    if not tail:
+        return empty if empty is not None else load_dataset(path, exact=True)
+    return pd.concat(tail, ignore_index=True)
+
+
+def base_estimator(n_jobs=1):
+    # Histogram trees; each search candidate runs single-threaded while the
+    # search itself spreads candidates across cores
+    return XGBClassifier(random_state=RANDOM_STATE, tree_method='hist', n_jobs=n_jobs)
+
+
+def search_model(X, y, n_jobs=-1, verbose=0):
+    """Successive-halving search over PARAM_GRID, candidates run in parallel.
+
+    Every round trains the surviving configurations on three times as many
+    samples, so most of the 108 configurations are discarded after fitting
+    on a fraction of the data.
+    """
+    search = HalvingGridSearchCV(
+        estimator=base_estimator(),
+        param_grid=PARAM_GRID,
+        factor=3,
+        scoring='accuracy',
+        cv=3,
+        n_jobs=n_jobs,
+        random_state=RANDOM_STATE,
+        verbose=verbose,
+    )
+    search.fit(X, y)
+    return search
+
+
+def evaluate(model, X_test, y_test):
+    return classification_metrics(y_test, model.predict(X_test))
+
+
+def classification_metrics(y_test, y_pred):
+    return {
+        'accuracy': accuracy_score(y_test, y_pred),
+        'recall_high_risk': recall_score(y_test, y_pred, pos_label=1),
+        'confusion_matrix': confusion_matrix(y_test, y_pred).tolist(),
+        'classification_report': classification_report(
+            y_test, y_pred, target_names=['Low Risk', 'High Risk'], output_dict=True
+        ),
+        'test_rows': int(len(y_test)),
+    }
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def save_artifact(model, features, metrics, out_dir=ARTIFACTS_DIR, version=None):
+    """Write the native model, its schema and metrics.json into one versioned directory.
+
+    features is the artifact schema (see artifact.feature_schema).
+    """
+    version = version or datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    path = os.path.join(out_dir, f"risk-model-{version}")
+    os.makedirs(path, exist_ok=False)
+    save_native_artifact(model.get_booster(), path, features, risk_map, {'version': version})
+    with open(os.path.join(path, 'metrics.json'), 'w') as f:
+        json.dump(dict(metrics, version=version), f, indent=2)
+    return path
+
+
+def install_model(model, columns, model_path=MODEL_PATH, columns_path=COLUMNS_PATH):
+    """Write a trained model and its columns to the app's pickle paths."""
+    joblib.dump(model, model_path)
+    with open(columns_path, 'w') as f:
+        json.dump(list(columns), f)
+
+
+def train(dataset=DATASET_PATH, out_dir=ARTIFACTS_DIR, n_jobs=-1, verbose=0, install=False, log=sys.stderr):
+    """Run the full pipeline and return the artifact directory."""
+    start = time.perf_counter()
+    X, y = load_training_data(dataset)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=TEST_SIZE, random_state=RANDOM_STATE)
+    X_resampled, y_resampled = SMOTE(random_state=RANDOM_STATE).fit_resample(X_train, y_train)
+
+    search = search_model(X_resampled, y_resampled, n_jobs=n_jobs, verbose=verbose)
+    model = search.best_estimator_
+    elapsed = time.perf_counter() - start
+
+    metrics = evaluate(model, X_test, y_test)
+    metrics.update({
+        'best_params': search.best_params_,
+        'cv_accuracy': float(search.best_score_),
+        'candidates_per_round': [int(n) for n in search.n_candidates_],
+        'samples_per_round': [int(n) for n in search.n_resources_],
+        'train_seconds': elapsed,
+        'dataset': os.path.basename(dataset),
+        'dataset_sha256': _file_sha256(dataset),
+        'dataset_rows': int(len(X)),
+        'label_map': LABEL_MAP,
+    })
+    path = save_artifact(model, feature_schema(X), metrics, out_dir)
+    if install:
+        install_model(model, X.columns)
+    print(
+        f"Trained in {elapsed:.1f}s: accuracy {metrics['accuracy']:.3f}, "
+        f"high-risk recall {metrics['recall_high_risk']:.3f} -> {path}",
+        file=log,
+    )
+    return path
+
+
+# Out-of-core training: the dataset is read in chunks on every pass and fed to
+# XGBoost through a DataIter, so only one chunk of rows is ever held as a frame.
+# Imbalance is handled with balanced class weights instead of SMOTE.
+
+def _read_chunks(path, chunksize):
+    """(row numbers, features, encoded target) for each chunk of the dataset."""
+    offset = 0
+    for chunk in iter_dataset(path, chunksize):
+        y = chunk['RiskLevel'].map(LABEL_MAP)
+        if y.isna().any():
+            unknown = sorted(chunk.loc[y.isna(), 'RiskLevel'].astype(str).unique())
+            raise ValueError(f"Unknown RiskLevel values {unknown} near row {offset}")
+        row_ids = np.arange(offset, offset + len(chunk))
+        offset += len(chunk)
+        yield row_ids, chunk.drop(columns=['RiskLevel']), y.to_numpy(dtype=np.int64)
+
+
+def balanced_weights(class_counts):
+    # Same as sklearn's class_weight='balanced'
+    return class_counts.sum() / (len(class_counts) * np.maximum(class_counts, 1))
+
+
+def scan_dataset(path, chunksize=STREAM_CHUNKSIZE, test_size=TEST_SIZE):
+    """One pass over the dataset: imputation means, feature schema and class weights."""
+    columns = sums = counts = mins = maxs = is_int = None
+    class_counts = np.zeros(len(LABEL_MAP), dtype=np.int64)
+    rows = 0
+    for row_ids, X, y in _read_chunks(path, chunksize):
+        rows += len(row_ids)
+        if columns is None:
+            columns = list(X.columns)
+            sums, counts = np.zeros(len(columns)), np.zeros(len(columns), dtype=np.int64)
+            mins, maxs = np.full(len(columns), np.inf), np.full(len(columns), -np.inf)
+            is_int = np.ones(len(columns), dtype=bool)
+        non_numeric = [name for name in columns if not np.issubdtype(X[name].dtype, np.number)]
+        if non_numeric:
+            raise ValueError(f"Streaming training needs numeric features, got {non_numeric}")
+        values = X.to_numpy(dtype=np.float64)
+        present = ~np.isnan(values)
+        sums += np.where(present, values, 0).sum(axis=0)
+        counts += present.sum(axis=0)
+        mins = np.fmin(mins, np.nanmin(np.where(present, values, np.inf), axis=0))
+        maxs = np.fmax(maxs, np.nanmax(np.where(present, values, -np.inf), axis=0))
+        is_int &= [np.issubdtype(X[name].dtype, np.integer) for name in columns]
+        class_counts += np.bincount(y[~holdout_mask(row_ids, test_size)], minlength=len(class_counts))
+    if columns is None:
+        raise ValueError(f"{path} has no rows")
+
+    means = dict(zip(columns, (sums / np.maximum(counts, 1)).tolist()))
+    features = [
+        {'name': name, 'dtype': 'int' if integer else 'float', 'min': float(low), 'max': float(high)}
+        for name, integer, low, high in zip(columns, is_int, mins, maxs)
+    ]
+    return {
+        'means': means,
+        'features': features,
+        'rows': rows,
+        'class_counts': class_counts,
+        'class_weights': balanced_weights(class_counts),
+    }
+
+
+class ChunkIter(xgb.DataIter):
+    """Feeds the training (or holdout) rows of a dataset to XGBoost chunk by chunk."""
+
+    def __init__(self, path, summary, chunksize=STREAM_CHUNKSIZE, holdout=False, test_size=TEST_SIZE,
+                 cache_prefix=None):
+        self.path = path
+        self.summary = summary
+        self.chunksize = chunksize
+        self.holdout = holdout
+        self.test_size = test_size
+        self._chunks = None
+        super().__init__(cache_prefix=cache_prefix)
+
+    def chunks(self):
+        """Imputed float32 features and targets of the selected rows, chunk by chunk."""
+        for row_ids, X, y in _read_chunks(self.path, self.chunksize):
+            keep = holdout_mask(row_ids, self.test_size) == self.holdout
+            if keep.any():
+                yield X[keep].fillna(self.summary['means']).astype(np.float32), y[keep]
+
+    def reset(self):
+        self._chunks = None
+
+    def next(self, input_data):
+        if self._chunks is None:
+            self._chunks = self.chunks()
+        for X, y in self._chunks:
+            input_data(data=X, label=y, weight=self.summary['class_weights'][y])
+            return True
+        return False
+
+
+def booster_params(params, n_jobs=-1):
+    """Native training parameters and round count for sklearn-style params."""
+    params = dict(params)
+    rounds = params.pop('n_estimators', 100)
+    params.update({
+        'objective': 'binary:logistic',
+        'tree_method': 'hist',
+        'seed': RANDOM_STATE,
+        'nthread': os.cpu_count() if n_jobs in (None, -1) else n_jobs,
+    })
+    return params, rounds
+
+
+def _as_classifier(booster):
+    # Wrap a booster so it saves and installs like the search's estimator
+    model = XGBClassifier()
+    model.load_model(bytearray(booster.save_raw('ubj')))
+    return model
+
+
+def train_in_memory(dataset=DATASET_PATH, params=None, n_jobs=-1):
+    """The streaming recipe trained on the whole dataset in memory.
+
+    Same hash split, mean imputation, balanced class weights and params as
+    train_streaming, so the two models should agree. Returns (booster,
+    holdout features, holdout targets).
+    """
+    X, y = load_training_data(dataset)
+    X = X.astype(np.float32)
+    y = y.to_numpy(dtype=np.int64)
+    test = holdout_mask(np.arange(len(X)))
+    class_weights = balanced_weights(np.bincount(y[~test], minlength=len(LABEL_MAP)))
+    dtrain = xgb.QuantileDMatrix(X[~test], label=y[~test], weight=class_weights[y[~test]])
+    native_params, rounds = booster_params(params or STREAM_PARAMS, n_jobs)
+    return xgb.train(native_params, dtrain, num_boost_round=rounds), X[test], y[test]
+
+
+def compare_with_in_memory(booster, dataset=DATASET_PATH, params=None, n_jobs=-1, tolerance=STREAM_TOLERANCE,
+                           min_agreement=STREAM_MIN_AGREEMENT):
+    """Holdout metrics of a streamed booster next to train_in_memory's, and whether they agree."""
+    reference, X_test, y_test = train_in_memory(dataset, params, n_jobs)
+    streamed = (booster.inplace_predict(X_test) > 0.5).astype(np.int64)
+    in_memory = (reference.inplace_predict(X_test) > 0.5).astype(np.int64)
+    report = {'agreement': float((streamed == in_memory).mean()), 'holdout_rows': int(len(y_test))}
+    passed = report['agreement'] >= min_agreement
+    for name, y_pred in [('streaming', streamed), ('in_memory', in_memory)]:
+        metrics = classification_metrics(y_test, y_pred)
+        report[name] = {'accuracy': metrics['accuracy'], 'recall_high_risk': metrics['recall_high_risk']}
+    for key in ('accuracy', 'recall_high_risk'):
+        passed &= abs(report['streaming'][key] - report['in_memory'][key]) <= tolerance
+    report['passed'] = bool(passed)
+    return report
+
+
+def train_streaming(dataset=DATASET_PATH, out_dir=ARTIFACTS_DIR, chunksize=STREAM_CHUNKSIZE, params=None,
+                    n_jobs=-1, cache_dir=None, install=False, check=False, log=sys.stderr):
+    """Train without loading the dataset into memory and return the artifact directory.
+
+    The quantized training matrix is built from ChunkIter. With cache_dir,
+    its pages are kept on disk (ExtMemQuantileDMatrix) so memory stays
+    bounded by the chunk size rather than the dataset. With check, the
+    model is compared with train_in_memory on the holdout (which needs the
+    dataset to fit in memory) and not saved unless they agree.
+    """
+    start = time.perf_counter()
+    summary = scan_dataset(dataset, chunksize)
+    train_iter = ChunkIter(
+        dataset, summary, chunksize,
+        cache_prefix=os.path.join(cache_dir, 'train') if cache_dir else None,
+    )
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        dtrain = xgb.ExtMemQuantileDMatrix(train_iter)
+    else:
+        dtrain = xgb.QuantileDMatrix(train_iter)
+    native_params, rounds = booster_params(params or STREAM_PARAMS, n_jobs)
+    booster = xgb.train(native_params, dtrain, num_boost_round=rounds)
+    del dtrain
+    elapsed = time.perf_counter() - start
+
+    # Holdout predictions are reduced to labels as they stream past
+    y_test, y_pred = [], []
+    for X, y in ChunkIter(dataset, summary, chunksize, holdout=True).chunks():
+        y_test.append(y.astype(np.int8))
+        y_pred.append((booster.inplace_predict(X) > 0.5).astype(np.int8))
+    if not y_test:
+        raise ValueError(f"{dataset} is too small for a holdout set")
+    metrics = classification_metrics(np.concatenate(y_test), np.concatenate(y_pred))
+    if check:
+        report = compare_with_in_memory(booster, dataset, params, n_jobs)
+        metrics['in_memory_check'] = report
+        if not report['passed']:
+            raise ValueError(f"Streaming and in-memory training disagree on the holdout: {report}")
+
+    model = _as_classifier(booster)
+    metrics.update({
+        'mode': 'streaming',
+        'params': dict(params or STREAM_PARAMS),
+        'chunksize': chunksize,
+        'class_weights': summary['class_weights'].tolist(),
+        'train_rows': int(summary['class_counts'].sum()),
+        'train_seconds': elapsed,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'dataset': os.path.basename(dataset),
+        'dataset_sha256': _file_sha256(dataset),
+        'dataset_rows': summary['rows'],
+        'label_map': LABEL_MAP,
+    })
+    path = save_artifact(model, summary['features'], metrics, out_dir)
+    if install:
+        install_model(model, [feature['name'] for feature in summary['features']])
+    print(
+        f"Trained (streaming) in {elapsed:.1f}s: accuracy {metrics['accuracy']:.3f}, "
+        f"high-risk recall {metrics['recall_high_risk']:.3f} -> {path}",
+        file=log,
+    )
+    return path
+
+
+# Incremental updates: continue boosting an existing artifact on the records
+# appended to the dataset since it was trained, and promote the result only if
+# it holds up on a holdout of those records and on the holdout the existing
+# records were evaluated on.
+
+def original_holdout(dataset, seen, base_metrics, features, chunksize=STREAM_CHUNKSIZE):
+    """Features and targets of the test rows among the first seen records.
+
+    The split is the one the base was evaluated with: the hash holdout for
+    streamed or updated artifacts, the seeded train_test_split for train().
+    The records are read chunk by chunk and only the test rows kept; gaps
+    are filled with the means of all seen records, as in training.
+    """
+    if base_metrics.get('mode') is None:
+        _, test_ids = train_test_split(np.arange(seen), test_size=TEST_SIZE, random_state=RANDOM_STATE)
+        test = np.zeros(seen, dtype=bool)
+        test[test_ids] = True
+    else:
+        test = holdout_mask(np.arange(seen))
+    sums, counts = np.zeros(len(features)), np.zeros(len(features))
+    X_parts, y_parts = [], []
+    for row_ids, X, y in _read_chunks(dataset, chunksize):
+        keep = row_ids < seen
+        if not keep.any():
+            break
+        values = X.loc[keep, features].to_numpy(dtype=np.float64)
+        present = ~np.isnan(values)
+        sums += np.where(present, values, 0).sum(axis=0)
+        counts += present.sum(axis=0)
+        rows = keep & test[np.minimum(row_ids, seen - 1)]
+        X_parts.append(values[rows[keep]])
+        y_parts.append(y[rows])
+    X = np.concatenate(X_parts) if X_parts else np.empty((0, len(features)))
+    means = sums / np.maximum(counts, 1)
+    X = np.where(np.isnan(X), means, X).astype(np.float32)
+    return X, np.concatenate(y_parts) if y_parts else np.empty(0, dtype=np.int64)
+
+
+def update_model(base_path, dataset=DATASET_PATH, out_dir=ARTIFACTS_DIR, rounds=UPDATE_ROUNDS, refresh=False,
+                 tolerance=UPDATE_TOLERANCE, n_jobs=-1, install=False, log=sys.stderr):
+    """Update the artifact at base_path; returns the new artifact directory, or None if rejected.
+
+    The base's metrics.json records how many dataset rows it was trained
+    on; only rows after those are used. By default rounds trees are added
+    on top of the base booster; with refresh the existing trees are kept
+    and only their leaf values are refit. The candidate is promoted when
+    its accuracy and high-risk recall are within tolerance of the base
+    model's on the same rows, both on a holdout of the new records and on
+    the base's own holdout of the existing ones (see original_holdout), so
+    an update cannot trade the original population for the new one.
+    """
+    start = time.perf_counter()
+    with open(os.path.join(base_path, 'metrics.json')) as f:
+        base_metrics = json.load(f)
+    if 'dataset_rows' not in base_metrics:
+        raise ValueError(f"{base_path} does not record how many rows it was trained on")
+    seen = base_metrics['dataset_rows']
+    base = load_artifact(base_path)
+
+    X, y = load_training_data(dataset, skip_rows=seen)
+    if len(X) == 0:
+        print(f"No records added since {base_path}", file=log)
+        return None
+    X = X[base.features].astype(np.float32)
+    y = y.to_numpy(dtype=np.int64)
+    test = holdout_mask(np.arange(seen, seen + len(X)))
+    if not test.any() or test.all():
+        raise ValueError(f"{len(X)} new records are too few to split into training and holdout rows")
+
+    class_weights = balanced_weights(np.bincount(y[~test], minlength=len(LABEL_MAP)))
+    dtrain = xgb.DMatrix(X[~test], label=y[~test], weight=class_weights[y[~test]])
+    params = dict(base_metrics.get('params') or base_metrics.get('best_params') or STREAM_PARAMS)
+    native_params, _ = booster_params(params, n_jobs)
+    if refresh:
+        native_params.update({'process_type': 'update', 'updater': 'refresh', 'refresh_leaf': True})
+        rounds = base.booster.num_boosted_rounds()
+    booster = xgb.train(native_params, dtrain, num_boost_round=rounds, xgb_model=base.booster.copy())
+    elapsed = time.perf_counter() - start
+
+    def holdout(model, X_test, y_test):
+        return classification_metrics(y_test, (model.inplace_predict(X_test) > 0.5).astype(np.int64))
+
+    def holds_up(before, after):
+        return (after['accuracy'] >= before['accuracy'] - tolerance
+                and after['recall_high_risk'] >= before['recall_high_risk'] - tolerance)
+
+    def describe(before, after, rows):
+        return (f"accuracy {before['accuracy']:.3f} -> {after['accuracy']:.3f}, "
+                f"high-risk recall {before['recall_high_risk']:.3f} -> {after['recall_high_risk']:.3f} "
+                f"on {rows} rows")
+
+    before, after = holdout(base.booster, X[test], y[test]), holdout(booster, X[test], y[test])
+    X_old, y_old = original_holdout(dataset, seen, base_metrics, base.features)
+    if not len(y_old):
+        raise ValueError(f"{base_path} has no holdout rows among the {seen} records it was trained on")
+    old_before, old_after = holdout(base.booster, X_old, y_old), holdout(booster, X_old, y_old)
+    promoted = holds_up(before, after) and holds_up(old_before, old_after)
+    summary = (
+        f"{describe(before, after, int(test.sum()))} new holdout; "
+        f"{describe(old_before, old_after, len(y_old))} original holdout"
+    )
+    if not promoted:
+        print(f"Update rejected: {summary}", file=log)
+        return None
+
+    model = _as_classifier(booster)
+    metrics = dict(after, **{
+        'mode': 'refresh' if refresh else 'update',
+        'parent': os.path.basename(os.path.normpath(base_path)),
+        'parent_holdout': before,
+        'original_holdout': {'parent': old_before, 'updated': old_after},
+        'params': params,
+        'rounds_added': 0 if refresh else rounds,
+        'new_rows': int(len(X)),
+        'train_rows': int((~test).sum()),
+        'train_seconds': elapsed,
+        'dataset': os.path.basename(dataset),
+        'dataset_sha256': _file_sha256(dataset),
+        'dataset_rows': seen + int(len(X)),
+        'label_map': LABEL_MAP,
+    })
+    path = save_artifact(model, base.manifest['features'], metrics, out_dir)
+    if install:
+        install_model(model, base.features)
+    print(f"Updated in {elapsed:.1f}s: {summary} -> {path}", file=log)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the maternal risk model.")
+    parser.add_argument('--dataset', default=DATASET_PATH)
+    parser.add_argument('--out-dir', default=ARTIFACTS_DIR, help="Where versioned artifacts are written")
+    parser.add_argument('--n-jobs', type=int, default=-1, help="Parallel search workers (-1 = all cores)")
+    parser.add_argument('--install', action='store_true', help="Copy the new model and columns into the app")
+    parser.add_argument('--verbose', type=int, default=0)
+    parser.add_argument('--stream', action='store_true',
+                        help="Train out-of-core with class weights instead of SMOTE and the grid search")
+    parser.add_argument('--chunksize', type=int, default=STREAM_CHUNKSIZE, help="Rows per chunk with --stream")
+    parser.add_argument('--params', type=json.loads, help="Hyperparameters for --stream as JSON")
+    parser.add_argument('--cache-dir', help="With --stream, keep the quantized matrix on disk here")
+    parser.add_argument('--check', action='store_true',
+                        help="With --stream, also train in memory and require both models to agree on the holdout")
+    parser.add_argument('--update', metavar='ARTIFACT',
+                        help="Continue training this artifact on the rows appended to --dataset since it was built")
+    parser.add_argument('--rounds', type=int, default=UPDATE_ROUNDS, help="Trees added by --update")
+    parser.add_argument('--refresh', action='store_true', help="With --update, refit leaf values instead")
+    parser.add_argument('--tolerance', type=float, default=UPDATE_TOLERANCE,
+                        help="Largest holdout accuracy/recall drop --update may promote")
+    args = parser.parse_args(argv)
+
+    if args.update:
+        path = update_model(args.update, args.dataset, args.out_dir, args.rounds, args.refresh, args.tolerance,
+                            args.n_jobs, args.install)
+        sys.exit(0 if path else 1)
+    elif args.stream:
+        try:
+            train_streaming(args.dataset, args.out_dir, args.chunksize, args.params, args.n_jobs,
+                            args.cache_dir, args.install, args.check)
+        except ValueError as exc:
+            sys.exit(f"error: {exc}")
+    else:
+        train(args.dataset, args.out_dir, args.n_jobs, args.verbose, args.install)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+# What-if sweeps: how one patient's risk moves as one or two inputs vary
+#
+# The whole grid of perturbed inputs is scored with a single predict call on
+# a float32 matrix, so a 100x100 sweep costs one booster call instead of
+# 10,000 app reruns.
+#
+# Usage:
+#   python whatif.py SystolicBP BS --steps 100
+import argparse
+import functools
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from prediction_cache import FEATURE_DECIMALS
+from risk_model import artifact_cache, feature_stats, risk_label
+
+DEFAULT_STEPS = 100
+RISK = 'Risk'
+
+# Sweep range per input: feature_stats, plus the app's BMI widget bounds
+SWEEP_RANGES = dict(
+    {field: (stats['min'], stats['max']) for field, stats in feature_stats.items()},
+    BMI=(10.0, 50.0),
+)
+SWEEPABLE = list(SWEEP_RANGES)
+
+
+def sweep_values(feature, steps=DEFAULT_STEPS):
+    """Up to steps evenly spaced values across the feature's range, at its recording precision."""
+    low, high = SWEEP_RANGES[feature]
+    return np.unique(np.round(np.linspace(low, high, steps), FEATURE_DECIMALS[feature]))
+
+
+def risk_score(proba):
+    # Probability of any class other than the lowest-risk one
+    return 1.0 - proba[:, 0]
+
+
+def sweep(user_input, features, steps=DEFAULT_STEPS, artifacts=artifact_cache):
+    """Risk over a grid of one or two features, other inputs held at user_input.
+
+    Returns (axes, risk): the swept values per feature and an array of
+    shape (len(axes[0]),) or (len(axes[0]), len(axes[1])).
+    """
+    features = list(features)
+    if not 1 <= len(features) <= 2:
+        raise ValueError(f"Sweep one or two features, got {features}")
+    unknown = [feature for feature in features if feature not in SWEEP_RANGES]
+    if unknown:
+        raise ValueError(f"Cannot sweep {unknown}; choose from {SWEEPABLE}")
+
+    predictor = artifacts.predictor()
+    unused = [feature for feature in features if feature not in predictor.columns]
+    if unused:
+        raise ValueError(f"The model does not use {unused}, so sweeping them cannot change the risk")
+    axes = [sweep_values(feature, steps) for feature in features]
+    grids = np.meshgrid(*axes, indexing='ij')
+    matrix = np.tile(predictor.feature_row(user_input), (grids[0].size, 1))
+    for feature, grid in zip(features, grids):
+        matrix[:, predictor.columns.index(feature)] = grid.ravel()
+    risk = risk_score(predictor.predict_proba_matrix(matrix))
+    return axes, risk.reshape(grids[0].shape)
+
+
+def sweepable_features(artifacts=artifact_cache):
+    """Inputs with a sweep range that the current model actually uses."""
+    _, columns = artifacts.get()
+    return [feature for feature in SWEEPABLE if feature in columns]
+
+
+@functools.lru_cache(maxsize=64)
+def _sweep_frame(model_sha, items, features, steps):
+    axes, risk = sweep(dict(items), features, steps)
+    grids = np.meshgrid(*axes, indexing='ij')
+    frame = pd.DataFrame({feature: grid.ravel() for feature, grid in zip(features, grids)})
+    frame[RISK] = risk.ravel()
+    return frame
+
+
+def sweep_frame(user_input, features, steps=DEFAULT_STEPS):
+    """Long-format sweep (one column per swept feature plus 'Risk'), cached per input and model."""
+    artifact_cache.get()
+    items = tuple(sorted((field, float(value)) for field, value in user_input.items()))
+    return _sweep_frame(artifact_cache.stats()['model_sha256'], items, tuple(features), steps)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep one or two inputs around the average patient.")
+    # Only inputs the loaded model uses; sweeping any other cannot move the risk
+    parser.add_argument('features', nargs='+', choices=sweepable_features())
+    parser.add_argument('--steps', type=int, default=DEFAULT_STEPS)
+    args = parser.parse_args(argv)
+
+    from bench import synthetic_inputs
+
+    user_input = synthetic_inputs(1).iloc[0].to_dict()
+    model, _ = artifact_cache.get()
+    start = time.perf_counter()
+    try:
+        axes, risk = sweep(user_input, args.features, args.steps)
+    except ValueError as exc:
+        parser.error(str(exc))
+    elapsed = time.perf_counter() - start
+    print(
+        f"{risk.size} grid points over {args.features} in {elapsed * 1e3:.1f} ms; "
+        f"risk (1 - P({risk_label(0, model)})) from {risk.min():.3f} to {risk.max():.3f}",
+        file=sys.stderr,
+    )
+
+
+if __name__ == '__main__':
+    main()